@@ -1,55 +1,256 @@
+import click
+import codecs
+import datetime
 import flask
 import os
+import threading
+import time
+import uuid
+import weakref
 from dotenv import load_dotenv
-from flask_session import Session
-from flask_sqlalchemy import SQLAlchemy
+from flask.cli import ScriptInfo
+import fragments
 import helpers
+import metrics
+import passwords
+import ratelimit  # registers the sqlite:// limiter storage
 import sqlite3
-from werkzeug.security import generate_password_hash, check_password_hash
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from flask_wtf.csrf import CSRFProtect, CSRFError
-from flask_migrate import Migrate
 
-load_dotenv()
-app = flask.Flask(__name__)
-app.config["SECRET_KEY"] = os.getenv("SECRET_KEY")
-
-app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///fairsplit.db"
-app.config["SESSION_TYPE"] = "sqlalchemy"
-app.config["SESSION_PERMANENT"] = False
-app.config["SESSION_USE_SIGNER"] = True
-
-db = SQLAlchemy(app)
-migrate = Migrate(app, db)
-app.config["SESSION_SQLALCHEMY"] = db
-
-Session(app)
-
-csrf = CSRFProtect(app)
-
-limiter = Limiter(get_remote_address, app=app, default_limits=["600 per day", "150 per hour"])
-
-app.jinja_env.filters["usd"] = helpers.usd
-
-@app.after_request
+# Routes and commands live on a blueprint and the extensions are created
+# without an app, so importing this module builds nothing; create_app does.
+bp = flask.Blueprint("fairsplit", __name__, cli_group=None)
+csrf = CSRFProtect()
+limiter = Limiter(get_remote_address, default_limits=["600 per day", "150 per hour"])
+
+def settings_from_env():
+    """Return the configuration read from the environment (and .env)."""
+    load_dotenv()
+    return {
+        "SECRET_KEY": os.getenv("SECRET_KEY"),
+        # One SQLite database for helpers.get_db and SQLAlchemy alike; a path
+        # (default instance/fairsplit.db), a file: URI or ":memory:".
+        "DATABASE": os.getenv("DATABASE"),
+        # "cookie" keeps the session (just user_id and the CSRF token) in a signed
+        # cookie and never touches the database; "sqlalchemy" stores it server-side.
+        "SESSION_BACKEND": os.getenv("SESSION_BACKEND", "sqlalchemy"),
+        "SESSION_TYPE": "sqlalchemy",
+        "SESSION_PERMANENT": False,
+        "SESSION_USE_SIGNER": True,
+        # Only write a server-side session when it changes, not on every request.
+        "SESSION_REFRESH_EACH_REQUEST": False,
+        "PERMANENT_SESSION_LIFETIME": datetime.timedelta(hours=int(os.getenv("SESSION_LIFETIME_HOURS", 24 * 7))),
+        # Expired server-side sessions are deleted by `flask session_cleanup`
+        # (e.g. from cron) or, if set, on average once every N requests.
+        "SESSION_CLEANUP_N_REQUESTS": int(os.getenv("SESSION_CLEANUP_N_REQUESTS", 0)) or None,
+        # Deleted groups and accounts are purged by a background thread in batches
+        # of PURGE_BATCH_SIZE rows; PURGE_INTERVAL=0 leaves it to `flask purge`.
+        "PURGE_INTERVAL": int(os.getenv("PURGE_INTERVAL", 30)),
+        "PURGE_BATCH_SIZE": int(os.getenv("PURGE_BATCH_SIZE", helpers.PURGE_BATCH_SIZE)),
+        "PURGE_PAUSE_MS": int(os.getenv("PURGE_PAUSE_MS", 10)),
+        "SLOW_QUERY_MS": float(os.getenv("SLOW_QUERY_MS", metrics.SLOW_QUERY_MS)),
+        "SERVER_TIMING": os.getenv("SERVER_TIMING", "0") == "1",
+        "WRITE_QUEUE": os.getenv("WRITE_QUEUE", "0") == "1",
+        "PASSWORD_HASH_METHOD": os.getenv("PASSWORD_HASH_METHOD", passwords.HASH_METHOD),
+        "PASSWORD_HASH_WORKERS": int(os.getenv("PASSWORD_HASH_WORKERS", passwords.HASH_WORKERS)),
+        "PASSWORD_HASH_QUEUE": int(os.getenv("PASSWORD_HASH_QUEUE", passwords.HASH_QUEUE)),
+        "PASSWORD_HASH_TIMEOUT": float(os.getenv("PASSWORD_HASH_TIMEOUT", passwords.HASH_TIMEOUT)),
+        # memory:// keeps separate counters per worker; sqlite:///instance/ratelimit.db
+        # (see ratelimit.py) or a redis/memcached URI shares them.
+        "RATELIMIT_STORAGE_URI": os.getenv("RATELIMIT_STORAGE_URI", "memory://"),
+        # Compile templates and warm the password helpers in create_app, for
+        # servers that fork workers from a preloaded app.
+        "PRELOAD": os.getenv("PRELOAD", "0") == "1",
+        # Rendered group page fragments kept per worker; 0 disables the cache.
+        "FRAGMENT_CACHE_SIZE": int(os.getenv("FRAGMENT_CACHE_SIZE", fragments.FRAGMENT_CACHE_SIZE)),
+        # Compiled templates are kept here across restarts (default
+        # instance/jinja-cache); an empty value turns it off.
+        "TEMPLATE_CACHE_DIR": os.getenv("TEMPLATE_CACHE_DIR"),
+    }
+
+def resolve_database(app):
+    """Point DATABASE and SQLALCHEMY_DATABASE_URI at the same SQLite database."""
+    database = app.config.get("DATABASE")
+    if not database:
+        os.makedirs(app.instance_path, exist_ok=True)
+        database = os.path.join(app.instance_path, "fairsplit.db")
+    elif database == ":memory:":
+        # A named shared-cache database, so every pooled connection and
+        # SQLAlchemy see the same data. It lasts while a connection is open.
+        database = f"file:/fairsplit-{uuid.uuid4().hex}?mode=memory&cache=shared"
+    elif not database.startswith("file:"):
+        # Absolute, because SQLAlchemy would resolve a relative path against
+        # the instance folder and sqlite3 against the working directory.
+        database = os.path.abspath(database)
+    app.config["DATABASE"] = database
+    if database.startswith("file:"):
+        uri = f"sqlite:///{database}{'&' if '?' in database else '?'}uri=true"
+    else:
+        uri = f"sqlite:///{database}"
+    app.config.setdefault("SQLALCHEMY_DATABASE_URI", uri)
+
+def get_sqlalchemy(app):
+    """Return the app's Flask-SQLAlchemy extension, setting it up on first use.
+
+    Only server-side sessions and `flask db` need it, so with the cookie
+    backend a worker never imports SQLAlchemy.
+    """
+    if "sqlalchemy" not in app.extensions:
+        from flask_sqlalchemy import SQLAlchemy
+        engine_options = {}
+        if "mode=memory" in app.config["DATABASE"]:
+            from sqlalchemy.pool import StaticPool
+            engine_options = {"poolclass": StaticPool, "connect_args": {"check_same_thread": False}}
+        SQLAlchemy(app, engine_options=engine_options)
+        _sqlalchemy_apps.add(app)
+    return app.extensions["sqlalchemy"]
+
+# Held weakly, so the fork hook does not keep apps (say, one per test) alive.
+_sqlalchemy_apps = weakref.WeakSet()
+
+def _dispose_engines():
+    # A forked worker must open its own connections, not reuse the parent's.
+    for app in list(_sqlalchemy_apps):
+        with app.app_context():
+            for engine in app.extensions["sqlalchemy"].engines.values():
+                engine.dispose(close=False)
+
+os.register_at_fork(after_in_child=_dispose_engines)
+
+class MigrateCommand(click.Command):
+    """`flask db`, importing Flask-Migrate and alembic only when it runs."""
+
+    def make_context(self, info_name, args, parent=None, **extra):
+        app = parent.find_object(ScriptInfo).load_app()
+        if "migrate" not in app.extensions:
+            from flask_migrate import Migrate
+            Migrate(app, get_sqlalchemy(app))
+        from flask_migrate.cli import db
+        return db.make_context(info_name, args, parent, **extra)
+
+def purge_tombstones(app, pending):
+    """Work through pending purges in small batches, pausing between them.
+
+    Wakes when a route tombstones something, and every PURGE_INTERVAL
+    seconds to pick up purges left over from a restart.
+    """
+    while True:
+        pending.wait(app.config["PURGE_INTERVAL"])
+        pending.clear()
+        with app.app_context():
+            try:
+                while helpers.purge_step(helpers.get_db(), app.config["PURGE_BATCH_SIZE"]):
+                    time.sleep(app.config["PURGE_PAUSE_MS"] / 1000)
+            except Exception:
+                app.logger.exception("purge failed")
+
+def start_background_threads():
+    """Start this process's purge thread on its first request.
+
+    Threads do not survive a fork, so create_app leaves them alone: each
+    worker of a preloaded app starts its own, and CLI commands start none.
+    """
+    app = flask.current_app._get_current_object()
+    state = app.extensions["fairsplit"]
+    if state["pid"] == os.getpid():
+        return
+    with state["lock"]:
+        if state["pid"] == os.getpid():
+            return
+        state["purge_pending"] = threading.Event()
+        if app.config["PURGE_INTERVAL"] > 0:
+            threading.Thread(target=purge_tombstones, args=(app, state["purge_pending"]), name="fairsplit-purge", daemon=True).start()
+        state["pid"] = os.getpid()
+
+def wake_purge():
+    """Let the purge thread start on a new tombstone without waiting for PURGE_INTERVAL."""
+    flask.current_app.extensions["fairsplit"]["purge_pending"].set()
+
+def preload(app):
+    """Do once, before the server forks, the work each worker would repeat."""
+    with app.app_context():
+        for name in app.jinja_env.list_templates():
+            app.jinja_env.get_template(name)
+        passwords.preload()
+
+def create_app(config=None):
+    """Build the app from the environment, with config overriding it.
+
+    Extensions are only set up for what the configuration uses:
+    SQLAlchemy for server-side sessions, Flask-Migrate when `flask db`
+    runs. Run under gunicorn as `'app:create_app()'`; with --preload and
+    PRELOAD=1 the workers fork from an app whose templates are compiled.
+    """
+    app = flask.Flask(__name__)
+    app.config.update(settings_from_env())
+    app.config.update(config or {})
+    resolve_database(app)
+    app.extensions["fairsplit"] = {"pid": None, "lock": threading.Lock(), "purge_pending": threading.Event(),
+                                   "fragments": fragments.FragmentCache(app.config["FRAGMENT_CACHE_SIZE"])}
+
+    if app.config["SESSION_BACKEND"] == "sqlalchemy":
+        from flask_session import Session
+        app.config["SESSION_SQLALCHEMY"] = get_sqlalchemy(app)
+        Session(app)
+    elif app.config["SESSION_BACKEND"] != "cookie":
+        raise RuntimeError(f"unknown SESSION_BACKEND {app.config['SESSION_BACKEND']!r}")
+    app.cli.add_command(MigrateCommand("db", help="Perform database migrations."))
+
+    csrf.init_app(app)
+    limiter.init_app(app)
+
+    template_cache_dir = app.config["TEMPLATE_CACHE_DIR"]
+    if template_cache_dir is None:
+        template_cache_dir = os.path.join(app.instance_path, "jinja-cache")
+    if template_cache_dir:
+        os.makedirs(template_cache_dir, exist_ok=True)
+        app.jinja_env.bytecode_cache = fragments.CountingBytecodeCache(template_cache_dir)
+    app.jinja_env.filters["usd"] = helpers.usd
+    app.teardown_appcontext(helpers.close_db)
+    app.before_request(metrics.start_request)
+    app.after_request(metrics.finish_request)
+    app.before_request(start_background_threads)
+    app.register_blueprint(bp)
+
+    if app.config["PRELOAD"]:
+        preload(app)
+    return app
+
+@bp.after_app_request
 def after_request(response):
     """Ensure responses aren't cached"""
+    if response.get_etag()[0]:
+        # Versioned responses may be kept by the client, but only after
+        # revalidating them with If-None-Match.
+        response.headers["Cache-Control"] = "private, no-cache"
+        return response
     response.headers["Cache-Control"] = "no-cache, no-store, must-revalidate"
     response.headers["Expires"] = 0
     response.headers["Pragma"] = "no-cache"
     return response
 
-@app.errorhandler(CSRFError)
+@bp.app_errorhandler(passwords.HashingBusy)
+def handle_hashing_busy(e):
+    return helpers.error("server is busy, please try again", 503)
+
+@bp.app_errorhandler(CSRFError)
 def handle_csrf_error(e):
     return flask.render_template("csrf_error.html", reason=e.description), 400
 
-@app.route("/")
+@bp.route("/metrics")
+@limiter.exempt
+def metrics_endpoint():
+    """Expose request and query metrics for Prometheus."""
+    return flask.Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+@bp.route("/")
 @helpers.login_required
 def index():
     return flask.redirect("/groups")
 
-@app.route("/login", methods=["GET", "POST"])
+@bp.route("/login", methods=["GET", "POST"])
 def login():
     flask.session.clear()
 
@@ -63,18 +264,32 @@ def login():
             return helpers.error("must provide password", 403)
 
         cursor = helpers.get_db().cursor()
-        rows = cursor.execute("SELECT * FROM users WHERE username = ?", (username,)).fetchall()
+        rows = cursor.execute("SELECT * FROM users WHERE username = ? AND deleted_at IS NULL", (username,)).fetchall()
 
-        if len(rows) != 1 or not check_password_hash(rows[0]["hash"], password):
+        if len(rows) != 1:
+            passwords.reject_unknown_user()
+            return helpers.error("invalid username and/or password", 403)
+        if not passwords.verify_password(rows[0]["hash"], password):
             return helpers.error("invalid username and/or password", 403)
 
-        flask.session["user_id"] = rows[0]["id"]
+        # Upgrade hashes made with an older method while the password is at
+        # hand; the hash check keeps a concurrent password change intact.
+        user_id, old_hash = rows[0]["id"], rows[0]["hash"]
+        if passwords.needs_rehash(old_hash):
+            try:
+                new_hash = passwords.hash_password(password)
+            except passwords.HashingBusy:
+                pass
+            else:
+                helpers.write(lambda cursor: cursor.execute("UPDATE users SET hash = ? WHERE id = ? AND hash = ?", (new_hash, user_id, old_hash)))
+
+        flask.session["user_id"] = user_id
 
         return flask.redirect("/")
     
     return flask.render_template("login.html")
 
-@app.route("/register", methods=["GET", "POST"])
+@bp.route("/register", methods=["GET", "POST"])
 def register():
     flask.session.clear()
 
@@ -95,35 +310,32 @@ def register():
         if not any(x.isupper() for x in password):
             return helpers.error("Password must contain an uppercase letter", 403)
 
-        with helpers.get_db() as conn:
-            cursor = conn.cursor()
-            try:
-                cursor.execute("INSERT INTO users (username, hash) VALUES (?, ?)",
-                               (username, generate_password_hash(password)))
-                conn.commit()
-            except sqlite3.IntegrityError:
-                return helpers.error("username already taken", 403)
+        password_hash = passwords.hash_password(password)
+        try:
+            helpers.write(lambda cursor: cursor.execute("INSERT INTO users (username, hash) VALUES (?, ?)", (username, password_hash)))
+        except sqlite3.IntegrityError:
+            return helpers.error("username already taken", 403)
 
         return flask.redirect("/")
 
     return flask.render_template("register.html")
 
-@app.route("/logout")
+@bp.route("/logout")
 def logout():
     flask.session.clear()
     return flask.redirect("/login")
 
-@app.route("/groups", methods=["GET", "POST"])
+@bp.route("/groups", methods=["GET", "POST"])
 @helpers.login_required
 def groups():
     cursor = helpers.get_db().cursor()
 
-    groups = cursor.execute("SELECT * FROM groups JOIN memberships ON groups.id = memberships.group_id WHERE memberships.user_id = ?", (flask.session["user_id"],)).fetchall()
-    invites = cursor.execute("SELECT * FROM invites JOIN groups ON invites.group_id = groups.id WHERE invites.receiver_id = ?", (flask.session["user_id"],)).fetchall()
+    groups = helpers.get_group_summaries(cursor, flask.session["user_id"])
+    invites = cursor.execute("SELECT * FROM invites JOIN groups ON invites.group_id = groups.id WHERE invites.receiver_id = ? AND groups.deleted_at IS NULL", (flask.session["user_id"],)).fetchall()
 
     return flask.render_template("groups.html", groups=groups, invites=invites)
 
-@app.route("/groups/create", methods=["GET", "POST"])
+@bp.route("/groups/create", methods=["GET", "POST"])
 @helpers.login_required
 def create_group():
     if flask.request.method == "POST":
@@ -132,18 +344,19 @@ def create_group():
         if not group_name:
             return helpers.error("must provide group name", 403)
 
-        with helpers.get_db() as conn:
-            cursor = conn.cursor()
+        user_id = flask.session["user_id"]
+
+        def create(cursor):
             cursor.execute("INSERT INTO groups (name) VALUES (?)", (group_name,))
-            group_id = cursor.lastrowid
-            cursor.execute("INSERT INTO memberships (user_id, group_id, group_creator) VALUES (?, ?, ?)", (flask.session["user_id"], group_id, 1))
-            conn.commit()
+            cursor.execute("INSERT INTO memberships (user_id, group_id, group_creator) VALUES (?, ?, ?)", (user_id, cursor.lastrowid, 1))
+
+        helpers.write(create)
 
         return flask.redirect("/groups")
 
     return flask.render_template("groups.html")
 
-@app.route("/groups/accept", methods=["GET","POST"])
+@bp.route("/groups/accept", methods=["GET","POST"])
 @helpers.login_required
 def accept_invite():
     if flask.request.method == "POST":
@@ -153,22 +366,28 @@ def accept_invite():
             return helpers.error("must provide invite ID", 403)
 
         cursor = helpers.get_db().cursor()
-        group = cursor.execute("SELECT * FROM groups WHERE id = (SELECT group_id FROM invites WHERE id = ?)", (invite_id,)).fetchone()
+        group = cursor.execute("SELECT * FROM groups WHERE id = (SELECT group_id FROM invites WHERE id = ?) AND deleted_at IS NULL", (invite_id,)).fetchone()
 
         if not group:
             return helpers.error("group does not exist", 403)
 
-        with helpers.get_db() as conn:
-            cursor = conn.cursor()
-            cursor.execute("INSERT INTO memberships (user_id, group_id, group_creator) VALUES (?, ?, ?)", (flask.session["user_id"], group["id"], 0))
-            cursor.execute("DELETE FROM invites WHERE receiver_id = ? AND group_id = ?", (flask.session["user_id"], group["id"]))
-            conn.commit()
+        user_id = flask.session["user_id"]
+
+        def accept(cursor):
+            cursor.execute("INSERT INTO memberships (user_id, group_id, group_creator) VALUES (?, ?, ?)", (user_id, group["id"], 0))
+            cursor.execute("DELETE FROM invites WHERE receiver_id = ? AND group_id = ?", (user_id, group["id"]))
+            helpers.bump_group_version(cursor, group["id"])
+
+        try:
+            helpers.write(accept)
+        except sqlite3.IntegrityError:
+            return helpers.error("you are already a member of this group", 400)
 
         return flask.redirect("/groups")
 
     return helpers.error("invalid request", 403)
 
-@app.route("/groups/decline", methods=["GET","POST"])
+@bp.route("/groups/decline", methods=["GET","POST"])
 @helpers.login_required
 def decline_invite():
     if flask.request.method == "POST":
@@ -177,20 +396,18 @@ def decline_invite():
         if not invite_id:
             return helpers.error("must provide invite ID", 403)
 
-        with helpers.get_db() as conn:
-            cursor = conn.cursor()
-            cursor.execute("DELETE FROM invites WHERE receiver_id = ? AND id = ?", (flask.session["user_id"], invite_id))
-            conn.commit()
+        user_id = flask.session["user_id"]
+        helpers.write(lambda cursor: cursor.execute("DELETE FROM invites WHERE receiver_id = ? AND id = ?", (user_id, invite_id)))
 
         return flask.redirect("/groups")
 
     return helpers.error("invalid request", 403)
 
-@app.route("/groups/<int:group_id>", methods=["GET", "POST"])
+@bp.route("/groups/<int:group_id>", methods=["GET", "POST"])
 @helpers.login_required
 def view_group(group_id):
     cursor = helpers.get_db().cursor()
-    group = cursor.execute("SELECT * FROM groups WHERE id = ?", (group_id,)).fetchone()
+    group = cursor.execute("SELECT * FROM groups WHERE id = ? AND deleted_at IS NULL", (group_id,)).fetchone()
     if not group:
         return helpers.error("group does not exist", 404)
 
@@ -204,9 +421,6 @@ def view_group(group_id):
     if member_count <= 1:
         return helpers.error("group must have at least 2 members to split expenses", 400)
     
-    loans = cursor.execute("SELECT * FROM loans WHERE group_id = ?", (group_id,)).fetchall()
-    balances = helpers.calculate_balances(loans, flask.session["user_id"], members)
-
     tmp = cursor.execute("SELECT group_creator FROM memberships WHERE user_id = ? AND group_id = ?", (flask.session["user_id"], group_id)).fetchone()
     if not tmp:
         return helpers.error("you are not a member of this group", 403)
@@ -214,11 +428,129 @@ def view_group(group_id):
     if tmp["group_creator"] == 1:
         is_creator = True
 
-    transactions = cursor.execute("SELECT * FROM transactions WHERE group_id = ?", (group_id,)).fetchall()
+    # Balances and expenses are only queried and rendered when this version
+    # of the group has not been rendered for this user yet. The version is
+    # read first, so an entry never holds data older than its key.
+    user_id = flask.session["user_id"]
+    cache = flask.current_app.extensions["fairsplit"]["fragments"]
+    members_html = cache.render(("group_members", group_id, group["version"], user_id), "group_members.html", lambda: {
+        "group": group, "members": members, "current_user_id": user_id, "is_creator": is_creator,
+        "balances": helpers.get_balances(cursor, group_id, user_id, members)})
+
+    def expenses_context():
+        transactions, next_cursor = helpers.fetch_expenses(cursor, group_id)
+        return {"group": group, "current_user_id": user_id, "transactions": transactions, "next_cursor": next_cursor}
+
+    expenses_html = cache.render(("group_expenses", group_id, group["version"], user_id), "group_expenses.html", expenses_context)
+
+    return flask.render_template("view_group.html", group=group, members=members, current_user_id=user_id, is_creator=is_creator, members_html=members_html, expenses_html=expenses_html)
+
+def expenses_json(transactions):
+    """Serialize expense rows for the JSON endpoints, as seen by the current user."""
+    return [{"id": t["id"], "description": t["description"], "amount_cents": t["amount_cents"], "added_by": t["added_by"],
+             "timestamp": t["timestamp"], "can_remove": t["payer_id"] == flask.session["user_id"]} for t in transactions]
+
+@bp.route("/groups/<int:group_id>/expenses")
+@helpers.login_required
+def list_expenses(group_id):
+    cursor = helpers.get_db().cursor()
+    is_member = cursor.execute("SELECT * FROM memberships JOIN groups ON groups.id = memberships.group_id WHERE memberships.user_id = ? AND memberships.group_id = ? AND groups.deleted_at IS NULL", (flask.session["user_id"], group_id)).fetchone()
+    if not is_member:
+        return flask.jsonify(error="you are not a member of this group"), 403
+
+    try:
+        transactions, next_cursor = helpers.fetch_expenses(cursor, group_id, flask.request.args.get("before"))
+    except ValueError as e:
+        return flask.jsonify(error=str(e)), 400
+
+    return flask.jsonify(expenses=expenses_json(transactions), next=next_cursor)
+
+@bp.route("/groups/<int:group_id>/search")
+@helpers.login_required
+def search_expenses(group_id):
+    cursor = helpers.get_db().cursor()
+    is_member = cursor.execute("SELECT * FROM memberships JOIN groups ON groups.id = memberships.group_id WHERE memberships.user_id = ? AND memberships.group_id = ? AND groups.deleted_at IS NULL", (flask.session["user_id"], group_id)).fetchone()
+    if not is_member:
+        return flask.jsonify(error="you are not a member of this group"), 403
+
+    args = flask.request.args
+    try:
+        min_cents = helpers.parse_cents(args["min_amount"]) if args.get("min_amount") else None
+        max_cents = helpers.parse_cents(args["max_amount"]) if args.get("max_amount") else None
+        since = datetime.date.fromisoformat(args["since"]) if args.get("since") else None
+        until = datetime.date.fromisoformat(args["until"]) if args.get("until") else None
+        page = int(args.get("page", 1))
+        transactions, has_more = helpers.search_expenses(cursor, group_id, args.get("q", ""), min_cents, max_cents, since, until, page)
+    except ValueError as e:
+        return flask.jsonify(error=str(e)), 400
+
+    return flask.jsonify(expenses=expenses_json(transactions), page=page, next_page=page + 1 if has_more else None)
+
+EXPORT_FORMATS = {
+    "csv": (helpers.export_csv, "text/csv"),
+    "jsonl": (helpers.export_jsonl, "application/x-ndjson"),
+}
+
+@bp.route("/groups/<int:group_id>/export.<any(csv, jsonl):export_format>")
+@helpers.login_required
+def export_group(group_id, export_format):
+    """Stream the group's full ledger; memory use does not grow with its history."""
+    conn = helpers.get_db()
+    is_member = conn.execute("SELECT * FROM memberships JOIN groups ON groups.id = memberships.group_id WHERE memberships.user_id = ? AND memberships.group_id = ? AND groups.deleted_at IS NULL", (flask.session["user_id"], group_id)).fetchone()
+    if not is_member:
+        return helpers.error("you are not a member of this group", 403)
+
+    encode, mimetype = EXPORT_FORMATS[export_format]
+    # The pooled connection stays checked out until the last row is sent.
+    response = flask.Response(flask.stream_with_context(encode(helpers.iter_ledger(conn, group_id))), mimetype=mimetype)
+    response.headers["Content-Disposition"] = f"attachment; filename=fairsplit-group-{group_id}.{export_format}"
+    return response
+
+@bp.route("/groups/<int:group_id>/settle-plan")
+@helpers.login_required
+def settle_plan(group_id):
+    cursor = helpers.get_db().cursor()
+    group = cursor.execute("SELECT * FROM groups WHERE id = ? AND deleted_at IS NULL", (group_id,)).fetchone()
+    if not group:
+        return helpers.error("group does not exist", 404)
+
+    members = cursor.execute("SELECT users.username, users.id FROM memberships JOIN users ON memberships.user_id = users.id WHERE memberships.group_id = ?", (group_id,)).fetchall()
+    if flask.session["user_id"] not in [m["id"] for m in members]:
+        return helpers.error("you are not a member of this group", 403)
+
+    usernames = {m["id"]: m["username"] for m in members}
+    transfers = helpers.simplify_debts(helpers.get_net_positions(cursor, group_id, members))
+    transfers = [{"debtor_id": debtor_id, "debtor": usernames.get(debtor_id, "former member"),
+                  "creditor_id": creditor_id, "creditor": usernames.get(creditor_id, "former member"),
+                  "amount_cents": cents} for debtor_id, creditor_id, cents in transfers]
+
+    return flask.render_template("settle_plan.html", group=group, transfers=transfers, current_user_id=flask.session["user_id"])
+
+@bp.route("/api/groups/<int:group_id>/balances")
+@helpers.login_required
+def api_balances(group_id):
+    cursor = helpers.get_db().cursor()
+    group = cursor.execute("SELECT groups.id, groups.version FROM groups JOIN memberships ON memberships.group_id = groups.id WHERE groups.id = ? AND memberships.user_id = ? AND groups.deleted_at IS NULL", (group_id, flask.session["user_id"])).fetchone()
+    if not group:
+        return flask.jsonify(error="group does not exist or you are not a member"), 404
+
+    # Balances are relative to the viewer, so the tag covers the user as well
+    # as the group version.
+    etag = f"{group_id}-{group['version']}-{flask.session['user_id']}"
+    if flask.request.if_none_match.contains_weak(etag):
+        response = flask.Response(status=304)
+        response.set_etag(etag, weak=True)
+        return response
 
-    return flask.render_template("view_group.html", group=group, members=members, current_user_id=flask.session["user_id"], balances=balances, is_creator=is_creator, transactions=transactions)
+    members = cursor.execute("SELECT users.username, users.id FROM memberships JOIN users ON memberships.user_id = users.id WHERE memberships.group_id = ?", (group_id,)).fetchall()
+    balances = helpers.get_balances(cursor, group_id, flask.session["user_id"], members)
+    response = flask.jsonify(group_id=group_id, version=group["version"],
+                             balances=[{"member_id": m["id"], "username": m["username"], "amount_cents": balances[m["id"]]}
+                                       for m in members if m["id"] != flask.session["user_id"]])
+    response.set_etag(etag, weak=True)
+    return response
 
-@app.route("/groups/<int:group_id>/invite", methods=["GET", "POST"])
+@bp.route("/groups/<int:group_id>/invite", methods=["GET", "POST"])
 @helpers.login_required
 def invite_member(group_id):
     if flask.request.method == "POST":
@@ -226,30 +558,35 @@ def invite_member(group_id):
         if not username:
             return helpers.error("must provide username", 403)
 
-        with helpers.get_db() as conn:
-            cursor = conn.cursor()
-            group = cursor.execute("SELECT * FROM groups WHERE id = ?", (group_id,)).fetchone()
-            if not group:
-                return helpers.error("group does not exist", 404)
-            user = cursor.execute("SELECT * FROM users WHERE username = ?", (username,)).fetchone()
-            if not user:
-                return helpers.error("user not found", 404)
-
-            is_member = cursor.execute("SELECT * FROM memberships WHERE user_id = ? AND group_id = ?", (user["id"], group_id)).fetchone()
-            if is_member:
-                return helpers.error("user is already a member of this group", 400)
-            
-            is_invited = cursor.execute("SELECT * FROM invites WHERE receiver_id = ? AND group_id = ?", (user["id"], group_id)).fetchone()
-            if is_invited:
-                return helpers.error("user has already been invited to this group", 400)
-
-            cursor.execute("INSERT INTO invites (sender_id, receiver_id, group_id, group_name, status) VALUES (?, ?, ?, ?, ?)", (flask.session["user_id"], user["id"], group_id, group["name"], "active"))
+        cursor = helpers.get_db().cursor()
+        group = cursor.execute("SELECT * FROM groups WHERE id = ? AND deleted_at IS NULL", (group_id,)).fetchone()
+        if not group:
+            return helpers.error("group does not exist", 404)
+        user = cursor.execute("SELECT * FROM users WHERE username = ? AND deleted_at IS NULL", (username,)).fetchone()
+        if not user:
+            return helpers.error("user not found", 404)
+
+        is_member = cursor.execute("SELECT * FROM memberships WHERE user_id = ? AND group_id = ?", (user["id"], group_id)).fetchone()
+        if is_member:
+            return helpers.error("user is already a member of this group", 400)
+        
+        is_invited = cursor.execute("SELECT * FROM invites WHERE receiver_id = ? AND group_id = ?", (user["id"], group_id)).fetchone()
+        if is_invited:
+            return helpers.error("user has already been invited to this group", 400)
+
+        sender_id = flask.session["user_id"]
+
+        def invite(cursor):
+            cursor.execute("INSERT INTO invites (sender_id, receiver_id, group_id, group_name, status) VALUES (?, ?, ?, ?, ?)", (sender_id, user["id"], group_id, group["name"], "active"))
+            helpers.bump_group_version(cursor, group_id)
+
+        helpers.write(invite)
 
         return flask.redirect("/groups")
 
     return helpers.error("invalid request", 403)
 
-@app.route("/groups/<int:group_id>/expenses/add", methods=["GET", "POST"])
+@bp.route("/groups/<int:group_id>/expenses/add", methods=["GET", "POST"])
 @helpers.login_required
 def add_expense(group_id):
     if flask.request.method == "POST":
@@ -261,38 +598,78 @@ def add_expense(group_id):
         if not amount:
             return helpers.error("must provide amount", 403)
         try:
-            amount = float(amount)
-            if amount <= 0:
-                return helpers.error("amount must be positive", 403)
-        except ValueError:
-            return helpers.error("amount must be a number", 403)
-
-        cursor = helpers.get_db().cursor()
-        group = cursor.execute("SELECT * FROM groups WHERE id = ?", (group_id,)).fetchone()
-        if not group:
+            amount = helpers.parse_cents(amount)
+        except ValueError as e:
+            return helpers.error(str(e), 403)
+        if amount <= 0:
+            return helpers.error("amount must be positive", 403)
+
+        # The group check, membership check and member list come from one
+        # query; an empty result means the group does not exist.
+        conn = helpers.get_db()
+        rows = conn.execute("SELECT memberships.user_id AS id FROM groups LEFT JOIN memberships ON memberships.group_id = groups.id WHERE groups.id = ? AND groups.deleted_at IS NULL", (group_id,)).fetchall()
+        if not rows:
             return helpers.error("group does not exist", 404)
-
-        is_member = cursor.execute("SELECT * FROM memberships WHERE user_id = ? AND group_id = ?", (flask.session["user_id"], group_id)).fetchone()
-        if not is_member:
+        members = [row for row in rows if row["id"] is not None]
+        if flask.session["user_id"] not in {m["id"] for m in members}:
             return helpers.error("you are not a member of this group", 403)
 
-        cursor = helpers.get_db().cursor()
-        cursor.execute("INSERT INTO transactions (group_id, payer_id, description, amount) VALUES (?, ?, ?, ?)", (group_id, flask.session["user_id"], description, amount))
-        transaction_id = cursor.lastrowid
+        # Optional per-member weights from the "split unevenly" inputs; a
+        # blank input counts as an equal share.
+        weights = None
+        if any(flask.request.form.get(f"weight-{m['id']}") for m in members):
+            try:
+                weights = {m["id"]: float(flask.request.form.get(f"weight-{m['id']}") or 1) for m in members}
+            except ValueError:
+                return helpers.error("weights must be numbers", 403)
 
-        members = cursor.execute("SELECT users.id FROM memberships JOIN users ON memberships.user_id = users.id WHERE memberships.group_id = ?", (group_id,)).fetchall()
         try:
-            loans = helpers.split_expense(amount, members, flask.session["user_id"])
+            loans = helpers.split_expense(amount, members, flask.session["user_id"], weights)
         except ValueError as e:
             return helpers.error(str(e), 403)
-        for loan in loans:
-            cursor.execute("INSERT INTO loans (payer_id, payee_id, amount, transaction_id, group_id) VALUES (?, ?, ?, ?, ?)", (loan[0], loan[1], loan[2], transaction_id, group_id))
-        cursor.connection.commit()
+
+        # Three writes whatever the group size: the transaction with its packed
+        # shares, the ledger upsert, and the group version bump.
+        payer_id, shares = flask.session["user_id"], helpers.pack_shares(loans)
+
+        def add(cursor):
+            cursor.execute("INSERT INTO transactions (group_id, payer_id, description, amount_cents, shares) VALUES (?, ?, ?, ?, ?)", (group_id, payer_id, description, amount, shares))
+            helpers.apply_transactions_to_balances(cursor, "transactions.id = ?", (cursor.lastrowid,))
+            helpers.bump_group_version(cursor, group_id)
+
+        helpers.write(add)
         return flask.redirect(f"/groups/{group_id}")
 
     return helpers.error("invalid request", 403)
 
-@app.route("/groups/<int:group_id>/settle", methods=["GET", "POST"])
+def import_format(filename):
+    return "jsonl" if filename.lower().endswith((".jsonl", ".ndjson")) else "csv"
+
+@bp.route("/groups/<int:group_id>/expenses/import", methods=["POST"])
+@helpers.login_required
+def import_expenses(group_id):
+    """Import many expenses from an uploaded CSV or JSON-lines file in one request."""
+    upload = flask.request.files.get("file")
+    if not upload or not upload.filename:
+        return helpers.error("must provide a file", 403)
+
+    conn = helpers.get_db()
+    group = conn.execute("SELECT * FROM groups WHERE id = ? AND deleted_at IS NULL", (group_id,)).fetchone()
+    if not group:
+        return helpers.error("group does not exist", 404)
+    is_creator = conn.execute("SELECT * FROM memberships WHERE user_id = ? AND group_id = ? AND group_creator = 1", (flask.session["user_id"], group_id)).fetchone()
+    if not is_creator:
+        return helpers.error("only the group creator can import expenses", 403)
+
+    # Members are loaded once and every row is checked against them.
+    members = {row["username"]: row["id"] for row in conn.execute("SELECT users.username, users.id FROM memberships JOIN users ON memberships.user_id = users.id WHERE memberships.group_id = ?", (group_id,))}
+    # Large uploads are spooled to disk by werkzeug and parsed line by line;
+    # each line is decoded on its own so a bad byte is reported at its line.
+    stream = codecs.iterdecode(upload.stream, "utf-8-sig")
+    rows = helpers.read_import_rows(stream, import_format(upload.filename))
+    return flask.jsonify(helpers.import_expenses(group_id, members, rows, flask.session["user_id"]))
+
+@bp.route("/groups/<int:group_id>/settle", methods=["GET", "POST"])
 @helpers.login_required
 def settle_expense(group_id):
     if flask.request.method == "POST":
@@ -302,7 +679,7 @@ def settle_expense(group_id):
             return helpers.error("must provide payee ID", 403)
 
         cursor = helpers.get_db().cursor()
-        group = cursor.execute("SELECT * FROM groups WHERE id = ?", (group_id,)).fetchone()
+        group = cursor.execute("SELECT * FROM groups WHERE id = ? AND deleted_at IS NULL", (group_id,)).fetchone()
         if not group:
             return helpers.error("group does not exist", 404)
 
@@ -310,7 +687,7 @@ def settle_expense(group_id):
         if not is_member:
             return helpers.error("you are not a member of this group", 403)
 
-        payee = cursor.execute("SELECT * FROM users WHERE id = ?", (payee_id,)).fetchone()
+        payee = cursor.execute("SELECT * FROM users WHERE id = ? AND deleted_at IS NULL", (payee_id,)).fetchone()
         if not payee:
             return helpers.error("payee does not exist", 404)
 
@@ -318,46 +695,55 @@ def settle_expense(group_id):
         if not is_payee_member:
             return helpers.error("payee is not a member of this group", 403)
 
-        loans = cursor.execute("SELECT * FROM loans WHERE payer_id = ? AND payee_id = ? AND group_id = ?", (flask.session["user_id"], payee_id, group_id)).fetchall()
-        if not loans:
-            return helpers.error("no outstanding loans to settle", 400)
+        creditor_id = flask.session["user_id"]
 
-        
-        for loan in loans:
-            cursor.execute("DELETE FROM loans WHERE id = ?", (loan["id"],))
-    
-        cursor.connection.commit()
+        # Read the amount owed inside the write so two settles of the same
+        # debt cannot both see it outstanding.
+        def settle(cursor):
+            owed = cursor.execute("SELECT net_cents FROM balances WHERE group_id = ? AND creditor_id = ? AND debtor_id = ?", (group_id, creditor_id, payee["id"])).fetchone()
+            if not owed or owed["net_cents"] <= 0:
+                return False
+            helpers.record_settlement(cursor, group_id, payee["id"], creditor_id, owed["net_cents"])
+            helpers.bump_group_version(cursor, group_id)
+            return True
+
+        if not helpers.write(settle):
+            return helpers.error("no outstanding loans to settle", 400)
 
         return flask.redirect(f"/groups/{group_id}")
 
     return helpers.error("invalid request", 403)
 
-@app.route("/groups/<int:group_id>/expenses/<int:transaction_id>/remove", methods=["GET", "POST"])
+@bp.route("/groups/<int:group_id>/expenses/<int:transaction_id>/remove", methods=["GET", "POST"])
 @helpers.login_required
 def remove_expense(group_id, transaction_id):
     if flask.request.method == "POST":
         cursor = helpers.get_db().cursor()
-        transaction = cursor.execute("SELECT * FROM transactions WHERE id = ? AND group_id = ?", (transaction_id, group_id)).fetchone()
+        transaction = cursor.execute("SELECT transactions.* FROM transactions JOIN groups ON groups.id = transactions.group_id WHERE transactions.id = ? AND transactions.group_id = ? AND groups.deleted_at IS NULL", (transaction_id, group_id)).fetchone()
         if not transaction:
             return helpers.error("transaction does not exist", 404)
 
         if transaction["payer_id"] != flask.session["user_id"]:
             return helpers.error("only the payer can remove this transaction", 403)
 
-        cursor.execute("DELETE FROM loans WHERE transaction_id = ?", (transaction_id,))
-        cursor.execute("DELETE FROM transactions WHERE id = ?", (transaction_id,))
+        def remove(cursor):
+            helpers.apply_transactions_to_balances(cursor, "transactions.id = ?", (transaction_id,), sign=-1)
+            cursor.execute("DELETE FROM transactions WHERE id = ?", (transaction_id,))
+            helpers.bump_group_version(cursor, group_id)
+
+        helpers.write(remove)
 
         return flask.redirect(f"/groups/{group_id}")
 
     return helpers.error("invalid request", 403)
 
 
-@app.route("/groups/<int:group_id>/remove", methods=["GET", "POST"])
+@bp.route("/groups/<int:group_id>/remove", methods=["GET", "POST"])
 @helpers.login_required
 def remove_group(group_id):
     if flask.request.method == "POST":
         cursor = helpers.get_db().cursor()
-        group = cursor.execute("SELECT * FROM groups WHERE id = ?", (group_id,)).fetchone()
+        group = cursor.execute("SELECT * FROM groups WHERE id = ? AND deleted_at IS NULL", (group_id,)).fetchone()
         if not group:
             return helpers.error("group does not exist", 404)
 
@@ -365,40 +751,33 @@ def remove_group(group_id):
         if not is_creator:
             return helpers.error("only the group creator can remove the group", 403)
 
-        cursor.execute("DELETE FROM loans WHERE group_id = ?", (group_id,))
-        cursor.execute("DELETE FROM transactions WHERE group_id = ?", (group_id,))
-        cursor.execute("DELETE FROM memberships WHERE group_id = ?", (group_id,))
-        cursor.execute("DELETE FROM invites WHERE group_id = ?", (group_id,))
-        cursor.execute("DELETE FROM groups WHERE id = ?", (group_id,))
-        cursor.connection.commit()
+        # The group disappears now; its rows are deleted in the background.
+        helpers.write(lambda cursor: helpers.tombstone_group(cursor, group_id))
+        wake_purge()
 
         return flask.redirect("/groups")
     
     return helpers.error("invalid request", 403)
 
-@app.route("/profile", methods=["GET", "POST"])
+@bp.route("/profile", methods=["GET", "POST"])
 @helpers.login_required
 def profile():
     cursor = helpers.get_db().cursor()
-    user = cursor.execute("SELECT * FROM users WHERE id = ?", (flask.session["user_id"],)).fetchone()
+    user = cursor.execute("SELECT * FROM users WHERE id = ? AND deleted_at IS NULL", (flask.session["user_id"],)).fetchone()
     if not user:
         return helpers.error("user does not exist", 404)
-    groups = cursor.execute("SELECT * FROM groups JOIN memberships ON groups.id = memberships.group_id WHERE memberships.user_id = ?", (flask.session["user_id"],)).fetchall()
+    groups = cursor.execute("SELECT * FROM groups JOIN memberships ON groups.id = memberships.group_id WHERE memberships.user_id = ? AND groups.deleted_at IS NULL", (flask.session["user_id"],)).fetchall()
 
     if flask.request.method == "POST":
-        cursor.execute("DELETE FROM invites WHERE sender_id = ? OR receiver_id = ?", (flask.session["user_id"], flask.session["user_id"]))
-        cursor.execute("DELETE FROM memberships WHERE user_id = ?", (flask.session["user_id"],))
-        cursor.execute("DELETE FROM users WHERE id = ?", (flask.session["user_id"],))
-        cursor.execute("DELETE FROM loans WHERE payer_id = ? OR payee_id = ?", (flask.session["user_id"], flask.session["user_id"]))
-        cursor.execute("DELETE FROM transactions WHERE payer_id = ?", (flask.session["user_id"],))
-
-        cursor.connection.commit()
+        user_id = flask.session["user_id"]
+        helpers.write(lambda cursor: helpers.tombstone_user(cursor, user_id))
+        wake_purge()
         flask.session.clear()
         return flask.redirect("/register")
 
     return flask.render_template("profile.html", username=user["username"], groups=groups)
 
-@app.route("/profile/change-password", methods=["GET", "POST"])
+@bp.route("/profile/change-password", methods=["GET", "POST"])
 @helpers.login_required
 def change_password():
     if flask.request.method == "POST":
@@ -414,11 +793,11 @@ def change_password():
             return helpers.error("new passwords must match", 403)
 
         cursor = helpers.get_db().cursor()
-        user = cursor.execute("SELECT * FROM users WHERE id = ?", (flask.session["user_id"],)).fetchone()
+        user = cursor.execute("SELECT * FROM users WHERE id = ? AND deleted_at IS NULL", (flask.session["user_id"],)).fetchone()
         if not user:
             return helpers.error("user does not exist", 404)
 
-        if not check_password_hash(user["hash"], current_password):
+        if not passwords.verify_password(user["hash"], current_password):
             return helpers.error("current password is incorrect", 403)
         
         if current_password == new_password:
@@ -432,13 +811,81 @@ def change_password():
         if new_password != confirmation:
             return helpers.error("new passwords must match", 403)
 
-        cursor.execute("UPDATE users SET hash = ? WHERE id = ?", (generate_password_hash(new_password), flask.session["user_id"]))
-        cursor.connection.commit()
+        password_hash, user_id = passwords.hash_password(new_password), flask.session["user_id"]
+        helpers.write(lambda cursor: cursor.execute("UPDATE users SET hash = ? WHERE id = ?", (password_hash, user_id)))
 
         return flask.redirect("/profile")
 
     return flask.render_template("change_password.html")
 
+@bp.cli.command("rebuild-balances")
+@click.option("--check", is_flag=True, help="Only report drift, leave the ledger untouched.")
+def rebuild_balances_command(check):
+    """Rebuild the balances ledger from transactions and settlements and report drift."""
+    drift = helpers.rebuild_balances(helpers.get_db(), check_only=check)
+    if check:
+        click.echo(f"{drift} ledger rows drifted from transactions and settlements")
+    else:
+        click.echo(f"Rebuilt balances ledger ({drift} rows had drifted)")
+
+@bp.cli.command("export")
+@click.argument("group_ids", nargs=-1, type=int)
+@click.option("--format", "export_format", type=click.Choice(sorted(EXPORT_FORMATS)), default="csv", show_default=True)
+@click.option("--output-dir", type=click.Path(file_okay=False), default=".", show_default=True)
+def export_command(group_ids, export_format, output_dir):
+    """Export the ledgers of GROUP_IDS (default: every group) to one file per group."""
+    conn = helpers.get_db()
+    if not group_ids:
+        group_ids = [row["id"] for row in conn.execute("SELECT id FROM groups WHERE deleted_at IS NULL ORDER BY id")]
+    os.makedirs(output_dir, exist_ok=True)
+    encode = EXPORT_FORMATS[export_format][0]
+    for group_id in group_ids:
+        path = os.path.join(output_dir, f"fairsplit-group-{group_id}.{export_format}")
+        with open(path, "w", newline="") as f:
+            for chunk in encode(helpers.iter_ledger(conn, group_id)):
+                f.write(chunk)
+        click.echo(f"Exported group {group_id} to {path}")
+
+@bp.cli.command("import-expenses")
+@click.argument("group_id", type=int)
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--payer", help="Username to use for rows that name no payer.")
+@click.option("--batch-size", type=int, default=helpers.IMPORT_BATCH_SIZE, show_default=True, help="Rows per transaction.")
+def import_expenses_command(group_id, path, payer, batch_size):
+    """Import expenses into GROUP_ID from a CSV or JSON-lines file at PATH."""
+    conn = helpers.get_db()
+    if not conn.execute("SELECT * FROM groups WHERE id = ? AND deleted_at IS NULL", (group_id,)).fetchone():
+        raise click.ClickException(f"group {group_id} does not exist")
+    members = {row["username"]: row["id"] for row in conn.execute("SELECT users.username, users.id FROM memberships JOIN users ON memberships.user_id = users.id WHERE memberships.group_id = ?", (group_id,))}
+    if payer and payer not in members:
+        raise click.ClickException(f"{payer} is not a member of group {group_id}")
+
+    with open(path, "rb") as f:
+        rows = helpers.read_import_rows(codecs.iterdecode(f, "utf-8-sig"), import_format(path))
+        result = helpers.import_expenses(group_id, members, rows, members.get(payer), batch_size)
+    for error in result["errors"]:
+        click.echo(f"line {error['line']}: {error['error']}", err=True)
+    click.echo(f"Imported {result['imported']} expenses, skipped {result['failed']} rows")
+
+@bp.cli.command("purge")
+@click.option("--status", is_flag=True, help="Only show purge progress.")
+def purge_command(status):
+    """Purge tombstoned groups and accounts now, or show progress with --status."""
+    if not status:
+        batches = 0
+        while helpers.purge_step(helpers.get_db(), flask.current_app.config["PURGE_BATCH_SIZE"]):
+            batches += 1
+        click.echo(f"Purged in {batches} batches")
+    for purge in helpers.purge_status(helpers.get_db().cursor()):
+        if purge["finished_at"]:
+            state = f"finished {purge['finished_at']}"
+        elif purge["kind"] == "user":
+            state = f"pending, {purge['groups_left'] or 0} groups left to scan"
+        else:
+            state = "pending"
+        click.echo(f"{purge['kind']} {purge['target_id']}: {purge['rows_deleted']} rows deleted, {state}")
+
 if __name__ == "__main__":
+    app = create_app()
     with app.app_context():
-        db.create_all()
\ No newline at end of file
+        get_sqlalchemy(app).create_all()
\ No newline at end of file
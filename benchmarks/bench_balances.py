@@ -0,0 +1,51 @@
+"""Time calculate_balances and query_balances as the number of loans grows.
+
+    python benchmarks/bench_balances.py
+
+Both should scale linearly: the per-loan cost column stays roughly flat
+while the loan count grows by 10x per row.
+"""
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import json
+import random
+import sqlite3
+import time
+from helpers import calculate_balances, query_balances
+
+MEMBERS = 50
+SIZES = [1_000, 10_000, 100_000, 1_000_000]
+
+def best_of(fn, repeat=3):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+def main():
+    rng = random.Random(42)
+    members = [{"id": i} for i in range(1, MEMBERS + 1)]
+    print(f"{'loans':>10} {'python ms':>10} {'ns/loan':>8} {'sql ms':>10} {'ns/loan':>8}")
+    for size in SIZES:
+        loans = []
+        for _ in range(size):
+            payer, payee = rng.sample(range(1, MEMBERS + 1), 2)
+            loans.append({"payer_id": payer, "payee_id": payee, "amount": rng.randint(1, 10_000)})
+
+        conn = sqlite3.connect(":memory:")
+        conn.row_factory = sqlite3.Row
+        conn.execute("CREATE TABLE transactions (group_id INTEGER, payer_id INTEGER, shares TEXT)")
+        conn.execute("CREATE TABLE settlements (group_id INTEGER, debtor_id INTEGER, creditor_id INTEGER, amount_cents INTEGER)")
+        conn.execute("CREATE INDEX transactions_group ON transactions(group_id)")
+        conn.executemany("INSERT INTO transactions VALUES (1, ?, ?)",
+                         [(loan["payer_id"], json.dumps({loan["payee_id"]: loan["amount"]})) for loan in loans])
+
+        py = best_of(lambda: calculate_balances(loans, 1, members))
+        sql = best_of(lambda: query_balances(conn.cursor(), 1, 1, members))
+        print(f"{size:>10} {py * 1e3:>10.2f} {py / size * 1e9:>8.0f} {sql * 1e3:>10.2f} {sql / size * 1e9:>8.0f}")
+        conn.close()
+
+if __name__ == "__main__":
+    main()
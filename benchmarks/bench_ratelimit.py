@@ -0,0 +1,61 @@
+"""Compare rate-limit storages: cost per check and accuracy across workers.
+
+    python benchmarks/bench_ratelimit.py
+
+Times FixedWindowRateLimiter.hit against the in-memory default and the
+SQLite storage from ratelimit.py, then has several processes hit one key
+under a shared limit and prints how many hits each storage let through.
+In-memory counters are per process, so they admit the limit once per
+worker; the SQLite table admits it once in total.
+"""
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import multiprocessing
+import tempfile
+import time
+from limits import parse
+from limits.storage import storage_from_string
+from limits.strategies import FixedWindowRateLimiter
+import ratelimit
+
+HITS = 20_000
+KEYS = 500
+WORKERS = 4
+LIMIT = "1000 per hour"
+
+def per_check(uri):
+    limiter = FixedWindowRateLimiter(storage_from_string(uri))
+    limit = parse("1000000 per hour")
+    start = time.perf_counter()
+    for i in range(HITS):
+        limiter.hit(limit, f"10.0.0.{i % KEYS}")
+    return (time.perf_counter() - start) / HITS * 1e6
+
+def worker(uri, results):
+    limiter = FixedWindowRateLimiter(storage_from_string(uri))
+    limit = parse(LIMIT)
+    results.put(sum(limiter.hit(limit, "10.0.0.1") for _ in range(limit.amount)))
+
+def admitted(uri):
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=worker, args=(uri, results)) for _ in range(WORKERS)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    return sum(results.get() for _ in processes)
+
+def main():
+    with tempfile.TemporaryDirectory() as workdir:
+        storages = {
+            "memory": "memory://",
+            "sqlite": f"sqlite:///{os.path.join(workdir, 'ratelimit.db')}",
+        }
+        print(f"{'storage':>8} {'us/check':>10} {'admitted':>10}  ({WORKERS} workers, limit {LIMIT})")
+        for name, uri in storages.items():
+            cost = per_check(uri)
+            storage_from_string(uri).reset()
+            print(f"{name:>8} {cost:>10.2f} {admitted(uri):>10}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+"""Time simplify_debts on large random groups.
+
+    python benchmarks/bench_simplify.py
+
+Prints the transfer count next to the member count; the per-member cost
+should grow only logarithmically.
+"""
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import random
+import time
+from helpers import simplify_debts
+
+SIZES = [100, 1_000, 10_000, 100_000]
+
+def random_positions(rng, members):
+    positions = {i: rng.randint(-100_000, 100_000) for i in range(1, members)}
+    positions[members] = -sum(positions.values())
+    return positions
+
+def main():
+    rng = random.Random(42)
+    print(f"{'members':>10} {'transfers':>10} {'ms':>10} {'us/member':>10}")
+    for size in SIZES:
+        positions = random_positions(rng, size)
+        start = time.perf_counter()
+        transfers = simplify_debts(positions)
+        elapsed = time.perf_counter() - start
+        print(f"{size:>10} {len(transfers):>10} {elapsed * 1e3:>10.2f} {elapsed / size * 1e6:>10.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Time a cold start: importing app, create_app and the first requests.
+
+    python benchmarks/bench_startup.py --runs 10
+    python benchmarks/bench_startup.py --json
+
+Every run is a fresh interpreter, as a new gunicorn worker or test process
+would be, so module imports and lazy extension setup are measured rather
+than cached. Only the Jinja bytecode cache persists between runs, filled by
+the first one as by a worker's first boot. Reported per session backend as
+the median over the runs; with --json the medians are printed as JSON for
+comparing across commits.
+"""
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import argparse
+import json
+import sqlite3
+import statistics
+import subprocess
+import tempfile
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+BACKENDS = ["cookie", "sqlalchemy"]
+STEPS = ["import_ms", "create_app_ms", "first_request_ms", "second_request_ms"]
+
+# Runs in the child interpreter; prints one JSON line of step timings.
+CHILD = """
+import json, sys, time
+start = time.perf_counter()
+import app as fairsplit
+imported = time.perf_counter()
+app = fairsplit.create_app({"DATABASE": sys.argv[1], "SESSION_BACKEND": sys.argv[2], "TEMPLATE_CACHE_DIR": sys.argv[3],
+                            "SECRET_KEY": "benchmark", "PURGE_INTERVAL": 0,
+                            "RATELIMIT_ENABLED": False})
+created = time.perf_counter()
+client = app.test_client()
+client.get("/login")
+first = time.perf_counter()
+client.get("/login")
+second = time.perf_counter()
+print(json.dumps({"import_ms": (imported - start) * 1e3, "create_app_ms": (created - imported) * 1e3,
+                  "first_request_ms": (first - created) * 1e3, "second_request_ms": (second - first) * 1e3}))
+"""
+
+def run_once(db_path, backend, template_cache_dir):
+    output = subprocess.run([sys.executable, "-c", CHILD, db_path, backend, template_cache_dir], cwd=ROOT,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--json", action="store_true", help="print the medians as JSON")
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        db_path = os.path.join(workdir, "startup.db")
+        with sqlite3.connect(db_path) as conn, open(os.path.join(ROOT, "schema.sql")) as f:
+            conn.executescript(f.read())
+        for backend in BACKENDS:
+            runs = [run_once(db_path, backend, os.path.join(workdir, "jinja-cache")) for _ in range(args.runs)]
+            results[backend] = {step: round(statistics.median(run[step] for run in runs), 1) for step in STEPS}
+
+    if args.json:
+        print(json.dumps({"runs": args.runs, "results": results}, indent=2))
+        return
+    print(f"{'backend':>10} " + " ".join(f"{step:>18}" for step in STEPS) + f"  (median of {args.runs} runs)")
+    for backend, medians in results.items():
+        print(f"{backend:>10} " + " ".join(f"{medians[step]:>18.1f}" for step in STEPS))
+
+if __name__ == "__main__":
+    main()
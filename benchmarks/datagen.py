@@ -0,0 +1,80 @@
+"""Seeded synthetic data for benchmarks.
+
+    python benchmarks/datagen.py bench.db --users 500 --groups 20 --members 25 --expenses 2000
+
+Builds a SQLite database from schema.sql and fills it with users, groups,
+memberships and expenses. Expenses are split with helpers.split_expense and
+the balances ledger is rebuilt at the end, so the data looks exactly like
+what the app writes. The same seed always produces the same database.
+"""
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import argparse
+import random
+import sqlite3
+from werkzeug.security import generate_password_hash
+from helpers import pack_shares, rebuild_balances, split_expense
+
+SCHEMA = os.path.join(os.path.dirname(__file__), "..", "schema.sql")
+PASSWORD = "Benchmark1"
+BATCH_SIZE = 5_000
+
+def generate(path, users=50, groups=5, members=5, expenses=100, seed=42):
+    """Create a database at path and return a summary of what it holds.
+
+    members is per group and expenses is per group; members cannot exceed users.
+    """
+    if members > users:
+        raise ValueError("Members per group cannot exceed the number of users.")
+    rng = random.Random(seed)
+    if os.path.exists(path):
+        os.remove(path)
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    with open(SCHEMA) as f:
+        conn.executescript(f.read())
+
+    # Every user shares one cheap hash; benchmarks are not about hashing.
+    password_hash = generate_password_hash(PASSWORD, method="pbkdf2:sha256:1000")
+    conn.executemany("INSERT INTO users (id, username, hash) VALUES (?, ?, ?)",
+                     [(user_id, f"user{user_id}", password_hash) for user_id in range(1, users + 1)])
+
+    summary = {"users": users, "groups": [], "seed": seed}
+    for group_id in range(1, groups + 1):
+        member_ids = rng.sample(range(1, users + 1), members)
+        conn.execute("INSERT INTO groups (id, name) VALUES (?, ?)", (group_id, f"group{group_id}"))
+        conn.executemany("INSERT INTO memberships (user_id, group_id, group_creator) VALUES (?, ?, ?)",
+                         [(user_id, group_id, int(i == 0)) for i, user_id in enumerate(member_ids)])
+
+        member_rows = [{"id": user_id} for user_id in member_ids]
+        batch = []
+        for i in range(expenses):
+            payer_id = rng.choice(member_ids)
+            amount = rng.randint(100, 50_000)
+            loans = split_expense(amount, member_rows, payer_id)
+            batch.append((group_id, payer_id, amount, f"expense {i}", pack_shares(loans)))
+            if len(batch) == BATCH_SIZE:
+                conn.executemany("INSERT INTO transactions (group_id, payer_id, amount_cents, description, shares) VALUES (?, ?, ?, ?, ?)", batch)
+                batch = []
+        conn.executemany("INSERT INTO transactions (group_id, payer_id, amount_cents, description, shares) VALUES (?, ?, ?, ?, ?)", batch)
+        summary["groups"].append({"id": group_id, "members": member_ids})
+
+    conn.commit()
+    rebuild_balances(conn)
+    conn.execute("ANALYZE")
+    conn.close()
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--groups", type=int, default=5)
+    parser.add_argument("--members", type=int, default=5, help="members per group")
+    parser.add_argument("--expenses", type=int, default=100, help="expenses per group")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    generate(args.path, args.users, args.groups, args.members, args.expenses, args.seed)
+
+if __name__ == "__main__":
+    main()
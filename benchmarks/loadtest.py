@@ -0,0 +1,217 @@
+"""Concurrent load test that measures SQLite lock contention.
+
+    python benchmarks/loadtest.py --users 32 --duration 20 --write-ratio 0.3
+
+Seeds a database with datagen.generate, serves the app on a local port with
+werkzeug's threaded server and drives it over HTTP from one thread per
+simulated user. Every user belongs to the same few groups, so writes collide
+the way they do when a whole group settles up at once. Each user loops over
+a weighted mix of page views, expense-page and balance-API reads,
+add_expense and settle_expense until the time runs out.
+
+The report (JSON on stdout or --output) gives throughput, p50/p95/p99
+latency overall and per operation, status counts, the number of requests
+that failed with "database is locked" inside the app, and how many client
+retries those failures caused. Nothing leaves 127.0.0.1.
+
+Sessions default to the signed-cookie backend so the numbers reflect the
+app's own database; --session-backend sqlalchemy measures the server-side
+store as well.
+"""
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import argparse
+import http.cookiejar
+import json
+import logging
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import datagen
+
+OPERATIONS = {
+    # name: (method, weight within reads or writes)
+    "view_group": ("GET", 4),
+    "list_expenses": ("GET", 2),
+    "api_balances": ("GET", 2),
+    "groups": ("GET", 1),
+    "add_expense": ("POST", 3),
+    "settle_expense": ("POST", 1),
+}
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {name: [] for name in OPERATIONS}
+        self.statuses = {}
+        self.retries = 0
+        self.locked = 0
+
+    def record(self, name, seconds, status):
+        with self.lock:
+            self.latencies[name].append(seconds)
+            self.statuses[str(status)] = self.statuses.get(str(status), 0) + 1
+
+    def retried(self):
+        with self.lock:
+            self.retries += 1
+
+    def lock_error(self, sender, exception, **extra):
+        if isinstance(exception, sqlite3.OperationalError) and "locked" in str(exception):
+            with self.lock:
+                self.locked += 1
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    return round(sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))] * 1e3, 3)
+
+def summarise(latencies, elapsed):
+    latencies = sorted(latencies)
+    return {
+        "requests": len(latencies),
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": percentile(latencies, 0.50),
+        "p95_ms": percentile(latencies, 0.95),
+        "p99_ms": percentile(latencies, 0.99),
+        "max_ms": round(latencies[-1] * 1e3, 3) if latencies else None,
+    }
+
+def start_server(db_path, stats, write_queue=False, session_backend="cookie"):
+    """Serve the app on a free local port in a daemon thread."""
+    os.environ.setdefault("SECRET_KEY", "loadtest")
+    import flask
+    from werkzeug.serving import make_server
+    import app as fairsplit
+    app = fairsplit.create_app({"DATABASE": db_path, "WTF_CSRF_ENABLED": False, "RATELIMIT_ENABLED": False,
+                                "WRITE_QUEUE": write_queue, "SESSION_BACKEND": session_backend})
+    flask.got_request_exception.connect(stats.lock_error, app)
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+class User:
+    def __init__(self, base_url, username, user_id, group, rng, stats, retries):
+        self.base_url = base_url
+        self.username = username
+        self.user_id = user_id
+        self.group = group
+        self.rng = rng
+        self.stats = stats
+        self.retries = retries
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), _NoRedirect)
+
+    def request(self, method, path, data=None):
+        body = urllib.parse.urlencode(data).encode() if data is not None else None
+        try:
+            with self.opener.open(urllib.request.Request(self.base_url + path, data=body, method=method)) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            e.read()
+            return e.code
+
+    def login(self):
+        status = self.request("POST", "/login", {"username": self.username, "password": datagen.PASSWORD})
+        if status != 302:
+            raise RuntimeError(f"login failed for {self.username}: {status}")
+
+    def run_operation(self, name):
+        group_id = self.group["id"]
+        others = [member for member in self.group["members"] if member != self.user_id]
+        method = OPERATIONS[name][0]
+        path, data = {
+            "view_group": (f"/groups/{group_id}", None),
+            "list_expenses": (f"/groups/{group_id}/expenses", None),
+            "api_balances": (f"/api/groups/{group_id}/balances", None),
+            "groups": ("/groups", None),
+            "add_expense": (f"/groups/{group_id}/expenses/add",
+                            {"description": "load", "amount": f"{self.rng.randint(100, 20_000) / 100:.2f}"}),
+            "settle_expense": (f"/groups/{group_id}/settle", {"payee_id": self.rng.choice(others)}),
+        }[name]
+        for attempt in range(self.retries + 1):
+            if attempt:
+                self.stats.retried()
+                time.sleep(0.01 * 2 ** attempt * self.rng.random())
+            start = time.perf_counter()
+            status = self.request(method, path, data)
+            self.stats.record(name, time.perf_counter() - start, status)
+            if status < 500:
+                break
+
+    def loop(self, deadline, write_ratio):
+        reads = [name for name, (method, _) in OPERATIONS.items() if method == "GET"]
+        writes = [name for name, (method, _) in OPERATIONS.items() if method == "POST"]
+        while time.monotonic() < deadline:
+            names = writes if self.rng.random() < write_ratio else reads
+            self.run_operation(self.rng.choices(names, [OPERATIONS[name][1] for name in names])[0])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=16, help="concurrent simulated users")
+    parser.add_argument("--groups", type=int, default=2, help="groups the users are spread over")
+    parser.add_argument("--expenses", type=int, default=500, help="seeded expenses per group")
+    parser.add_argument("--duration", type=float, default=10, help="seconds to run")
+    parser.add_argument("--write-ratio", type=float, default=0.3, help="fraction of operations that write")
+    parser.add_argument("--retries", type=int, default=2, help="client retries after a 5xx response")
+    parser.add_argument("--write-queue", action="store_true", help="route writes through the group-commit writer thread")
+    parser.add_argument("--session-backend", choices=["cookie", "sqlalchemy"], default="cookie")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="write JSON here instead of stdout")
+    args = parser.parse_args()
+
+    stats = Stats()
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as workdir:
+        db_path = os.path.join(workdir, "loadtest.db")
+        # Every group holds every user, so all users contend on few groups.
+        summary = datagen.generate(db_path, users=args.users, groups=args.groups, members=args.users,
+                                   expenses=args.expenses, seed=args.seed)
+        server = start_server(db_path, stats, args.write_queue, args.session_backend)
+        base_url = f"http://127.0.0.1:{server.server_port}"
+
+        users = []
+        for user_id in range(1, args.users + 1):
+            group = summary["groups"][user_id % len(summary["groups"])]
+            user = User(base_url, f"user{user_id}", user_id, group, random.Random(rng.random()), stats, args.retries)
+            user.login()
+            users.append(user)
+
+        start = time.monotonic()
+        deadline = start + args.duration
+        threads = [threading.Thread(target=user.loop, args=(deadline, args.write_ratio)) for user in users]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - start
+        server.shutdown()
+
+    report = {
+        "config": vars(args),
+        "overall": summarise([s for latencies in stats.latencies.values() for s in latencies], elapsed),
+        "operations": {name: summarise(latencies, elapsed) for name, latencies in stats.latencies.items()},
+        "statuses": stats.statuses,
+        "lock_errors": stats.locked,
+        "retries": stats.retries,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
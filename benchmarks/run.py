@@ -0,0 +1,144 @@
+"""Benchmark helpers and hot routes at several data sizes and emit JSON.
+
+    python benchmarks/run.py --sizes small medium --output results.json
+    python benchmarks/run.py --compare results.json
+
+Each size gets a fresh database from datagen.generate. Routes are driven
+through the Flask test client with CSRF and rate limiting switched off, so
+the timings cover the view, its queries and template rendering. With
+--compare, medians are checked against an earlier run and any operation that
+slowed down by more than --threshold is reported; the exit status is 1 if
+there were regressions.
+"""
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import argparse
+import datetime
+import json
+import platform
+import sqlite3
+import statistics
+import tempfile
+import time
+import datagen
+import helpers
+
+SIZES = {
+    "small": {"users": 50, "groups": 5, "members": 5, "expenses": 100},
+    "medium": {"users": 500, "groups": 20, "members": 25, "expenses": 2_000},
+    "large": {"users": 2_000, "groups": 10, "members": 100, "expenses": 10_000},
+}
+REPEAT = 20
+
+def measure(fn, repeat=REPEAT):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1e3)
+    timings.sort()
+    return {
+        "runs": repeat,
+        "min_ms": round(timings[0], 3),
+        "median_ms": round(statistics.median(timings), 3),
+        "p95_ms": round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 3),
+        "mean_ms": round(statistics.fmean(timings), 3),
+    }
+
+def load_app(db_path):
+    os.environ.setdefault("SECRET_KEY", "benchmark")
+    import app as fairsplit
+    return fairsplit.create_app({"DATABASE": db_path, "WTF_CSRF_ENABLED": False, "RATELIMIT_ENABLED": False, "TESTING": True})
+
+def client_for(app, user_id):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session["user_id"] = user_id
+    return client
+
+def expect(response, status):
+    if response.status_code != status:
+        raise RuntimeError(f"expected {status}, got {response.status_code}")
+
+def bench_size(app, size, params, workdir):
+    # One file per size: connection pools are keyed by database path.
+    db_path = os.path.join(workdir, f"{size}.db")
+    summary = datagen.generate(db_path, **params)
+    app.config["DATABASE"] = db_path
+
+    group = summary["groups"][0]
+    group_id = group["id"]
+    members = [{"id": member_id} for member_id in group["members"]]
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    # Act as the member owed money by the most others so settle has work to do.
+    user_id = conn.execute("SELECT creditor_id FROM balances WHERE group_id = ? AND net_cents > 0 GROUP BY creditor_id ORDER BY COUNT(*) DESC, creditor_id LIMIT 1", (group_id,)).fetchone()[0]
+    loans = [{"payer_id": row["payer_id"], "payee_id": int(row["key"]), "amount": row["value"]}
+             for row in conn.execute("SELECT transactions.payer_id, shares.key, shares.value FROM transactions, json_each(transactions.shares) AS shares WHERE group_id = ?", (group_id,))]
+    owed_by = [row["debtor_id"] for row in conn.execute("SELECT debtor_id FROM balances WHERE group_id = ? AND creditor_id = ? AND net_cents > 0", (group_id, user_id))]
+    conn.close()
+
+    client = client_for(app, user_id)
+    results = {"dataset": params, "loans_in_group": len(loans)}
+    results["split_expense"] = measure(lambda: helpers.split_expense(12_345, members, user_id), repeat=200)
+    results["calculate_balances"] = measure(lambda: helpers.calculate_balances(loans, user_id, members), repeat=5)
+    results["view_group"] = measure(lambda: expect(client.get(f"/groups/{group_id}"), 200))
+    results["groups"] = measure(lambda: expect(client.get("/groups"), 200))
+    results["add_expense"] = measure(lambda: expect(client.post(f"/groups/{group_id}/expenses/add", data={"description": "bench", "amount": "12.34"}), 302))
+    # Each settle clears one debt, so every run needs a different debtor.
+    payees = iter(owed_by)
+    if owed_by:
+        results["settle_expense"] = measure(lambda: expect(client.post(f"/groups/{group_id}/settle", data={"payee_id": next(payees)}), 302),
+                                            repeat=min(REPEAT, len(owed_by)))
+    return results
+
+def compare(current, baseline, threshold):
+    regressions = []
+    for size, operations in current["results"].items():
+        for name, stats in operations.items():
+            before = baseline.get("results", {}).get(size, {}).get(name)
+            if not isinstance(stats, dict) or not isinstance(before, dict) or "median_ms" not in stats:
+                continue
+            ratio = stats["median_ms"] / before["median_ms"] if before["median_ms"] else 1
+            flag = "REGRESSION" if ratio > 1 + threshold else ""
+            print(f"{size:>8} {name:>20} {before['median_ms']:>10.3f} -> {stats['median_ms']:>10.3f} ms  x{ratio:.2f} {flag}", file=sys.stderr)
+            if flag:
+                regressions.append((size, name, ratio))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", nargs="+", choices=SIZES, default=["small", "medium"])
+    parser.add_argument("--output", help="write JSON here instead of stdout")
+    parser.add_argument("--compare", help="JSON from an earlier run to compare medians against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed median slowdown before flagging (default 0.2 = 20%%)")
+    args = parser.parse_args()
+
+    report = {
+        "meta": {
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+        },
+        "results": {},
+    }
+    with tempfile.TemporaryDirectory() as workdir:
+        app = load_app(os.path.join(workdir, "bench.db"))
+        for size in args.sizes:
+            report["results"][size] = bench_size(app, size, SIZES[size], workdir)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        sys.exit(1 if regressions else 0)
+
+if __name__ == "__main__":
+    main()
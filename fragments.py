@@ -0,0 +1,80 @@
+"""Caches for rendered templates: an LRU of page fragments and Jinja bytecode.
+
+Group page fragments are keyed on the group's version, which every write
+that changes what the page shows bumps in the same transaction (see
+helpers.bump_group_version). A write therefore invalidates the group's
+fragments for every worker at once: the next view misses and renders
+afresh, and the superseded entries fall out of the LRU. Each worker process
+has its own cache.
+
+CSRF tokens belong to the session, not the data, so fragments are rendered
+with a placeholder and the viewer's token is substituted on the way out.
+"""
+import collections
+import flask
+import jinja2
+import markupsafe
+import os
+import threading
+from flask_wtf.csrf import generate_csrf
+import metrics
+
+FRAGMENT_CACHE_SIZE = 512
+
+# Random per process, so no user-supplied text can collide with it.
+CSRF_PLACEHOLDER = f"csrf-placeholder-{os.urandom(16).hex()}"
+
+class FragmentCache:
+    """Bounded map of rendered HTML that evicts the least recently used entry.
+
+    Keys are tuples whose first item names the fragment; hits and misses are
+    counted per name in metrics. A maxsize of 0 disables caching.
+    """
+
+    def __init__(self, maxsize=FRAGMENT_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            html = self._entries.get(key)
+            if html is not None:
+                self._entries.move_to_end(key)
+        metrics.record_cache(key[0], html is not None)
+        return html
+
+    def set(self, key, html):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = html
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def render(self, key, template, context):
+        """Return template rendered for key, calling context() for its variables only on a miss."""
+        html = self.get(key)
+        if html is None:
+            html = flask.render_template(template, **context(), csrf_token=lambda: CSRF_PLACEHOLDER)
+            self.set(key, html)
+        return markupsafe.Markup(html.replace(CSRF_PLACEHOLDER, generate_csrf()))
+
+class CountingBytecodeCache(jinja2.FileSystemBytecodeCache):
+    """FileSystemBytecodeCache that counts its hits and misses in metrics.
+
+    A miss compiles the template and writes its bytecode; a template whose
+    source changed misses once, as its checksum no longer matches.
+    """
+
+    def load_bytecode(self, bucket):
+        super().load_bytecode(bucket)
+        metrics.record_cache("jinja_bytecode", bucket.code is not None)
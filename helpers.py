@@ -1,11 +1,79 @@
+import concurrent.futures
+import contextlib
+import csv
+import datetime
+import decimal
 import flask
 import functools
+import heapq
+import io
+import json
+from fractions import Fraction
+import math
+import metrics
 import sqlite3
 import os
+import queue
+import re
+import threading
 
-def usd(value):
-    """Format value as USD."""
-    return f"${value:,.2f}"
+POOL_SIZE = 8
+WRITE_BATCH_SIZE = 64
+WRITE_TIMEOUT = 30
+EXPENSES_PAGE_SIZE = 50
+SEARCH_PAGE_SIZE = 20
+EXPORT_BATCH_SIZE = 1000
+IMPORT_BATCH_SIZE = 500
+IMPORT_MAX_ERRORS = 100
+PURGE_BATCH_SIZE = 500
+# The largest value an SQLite INTEGER holds; larger ints overflow the bind.
+MAX_INTEGER = 2**63 - 1
+MAX_CENTS = MAX_INTEGER
+
+_pools = {}
+_pools_lock = threading.Lock()
+_writers = {}
+_writers_lock = threading.Lock()
+# Connections handed down by fork() are kept referenced, never used or
+# closed: the child opens its own.
+_inherited = []
+
+def _forget_connections():
+    global _pools, _pools_lock, _writers, _writers_lock
+    _inherited.append((_pools, _writers))
+    _pools, _pools_lock = {}, threading.Lock()
+    _writers, _writers_lock = {}, threading.Lock()
+
+os.register_at_fork(after_in_child=_forget_connections)
+
+def usd(cents):
+    """Format integer cents as USD."""
+    sign = "-" if cents < 0 else ""
+    return f"{sign}${abs(cents) // 100:,}.{abs(cents) % 100:02d}"
+
+def parse_cents(value):
+    """Parse a decimal amount such as "12.34" into integer cents.
+
+    Raises ValueError for anything that is not a finite number with at most
+    two decimal places, or whose cents would not fit in SQLite's 64-bit
+    INTEGER (MAX_CENTS).
+    """
+    try:
+        amount = decimal.Decimal(value.strip())
+    except decimal.InvalidOperation:
+        raise ValueError("Amount must be a number.")
+    if not amount.is_finite():
+        raise ValueError("Amount must be a number.")
+    # Checked on the exponent first, so "1e100000" is rejected without
+    # building a huge integer; MAX_CENTS has 19 digits.
+    if amount.adjusted() > 16:
+        raise ValueError("Amount is too large.")
+    if amount != amount.quantize(decimal.Decimal("0.01")):
+        raise ValueError("Amount must have at most two decimal places.")
+    cents = int(amount * 100)
+    if abs(cents) > MAX_CENTS:
+        raise ValueError("Amount is too large.")
+    return cents
 
 def error(message, code=400):
     """Render message as an apology to user."""
@@ -21,57 +89,817 @@ def login_required(f):
     @functools.wraps(f)
     def decorated_function(*args, **kwargs):
         if flask.session.get("user_id") is None:
-            return flask.redirect(flask.url_for("login", next=flask.request.url))
+            return flask.redirect(flask.url_for("fairsplit.login", next=flask.request.url))
         return f(*args, **kwargs)
 
     return decorated_function
 
-def get_db():
-    db_path = os.path.join(flask.current_app.instance_path, "fairsplit.db")
-    conn = sqlite3.connect(db_path)
+def _connect(db_path):
+    """Open a connection and apply the pragmas every pooled connection shares."""
+    # Pooled connections move between request threads, but only ever serve
+    # one request at a time.
+    conn = sqlite3.connect(db_path, timeout=5, check_same_thread=False, factory=metrics.InstrumentedConnection,
+                           uri=db_path.startswith("file:"))
     conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute("PRAGMA busy_timeout = 5000")
+    conn.execute("PRAGMA cache_size = -16000")
+    conn.execute("PRAGMA mmap_size = 134217728")
     return conn
 
-def split_expense(amount, members, payer_id):
+def _db_path():
+    return flask.current_app.config.get("DATABASE") or os.path.join(flask.current_app.instance_path, "fairsplit.db")
+
+def _get_pool(db_path):
+    with _pools_lock:
+        pool = _pools.get(db_path)
+        if pool is None:
+            size = flask.current_app.config.get("DATABASE_POOL_SIZE", POOL_SIZE)
+            pool = _pools[db_path] = queue.LifoQueue(maxsize=size)
+        return pool
+
+def get_db():
+    """Return the connection bound to the current app context.
+
+    The first call in a context takes a connection from the pool (or opens a
+    new one); later calls return the same connection. close_db hands it back.
+    """
+    if "db" not in flask.g:
+        db_path = _db_path()
+        try:
+            conn = _get_pool(db_path).get_nowait()
+        except queue.Empty:
+            conn = _connect(db_path)
+        flask.g.db = conn
+        flask.g.db_path = db_path
+    return flask.g.db
+
+def close_db(exception=None):
+    """Return the context's connection to its pool, discarding uncommitted work."""
+    conn = flask.g.pop("db", None)
+    db_path = flask.g.pop("db_path", None)
+    if conn is None:
+        return
+    if conn.in_transaction:
+        conn.rollback()
+    try:
+        _get_pool(db_path).put_nowait(conn)
+    except queue.Full:
+        conn.close()
+
+@contextlib.contextmanager
+def transaction(conn):
+    """Run the block in a BEGIN IMMEDIATE transaction and yield a cursor.
+
+    Taking the write lock up front means a busy database fails (or waits out
+    busy_timeout) at BEGIN rather than halfway through the writes. Commits on
+    success and rolls back on any exception.
+    """
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn.cursor()
+    except BaseException:
+        conn.rollback()
+        raise
+    else:
+        conn.commit()
+
+class _Writer:
+    """Thread that owns the only writing connection and commits in batches.
+
+    Each queued write runs inside its own savepoint, so one that raises is
+    undone without disturbing the rest of its batch; the batch as a whole is
+    one BEGIN IMMEDIATE ... COMMIT. Callers block until that commit is done,
+    so a redirect after a write always sees it, but for at most timeout
+    seconds. If the thread itself fails (say its connection cannot be
+    opened), every waiting write gets the error and the writer is dropped so
+    the next write starts a new one.
+    """
+
+    def __init__(self, db_path, batch_size, timeout=WRITE_TIMEOUT):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.queue = queue.SimpleQueue()
+        self.error = None
+        self._lock = threading.Lock()
+        self.thread = threading.Thread(target=self._run, name="fairsplit-writer", daemon=True)
+        self.thread.start()
+
+    def submit(self, fn):
+        future = concurrent.futures.Future()
+        with self._lock:
+            if self.error is not None:
+                raise self.error
+            self.queue.put((fn, future))
+        return future.result(self.timeout)
+
+    def _run(self):
+        batch = []
+        try:
+            conn = _connect(self.db_path)
+            while True:
+                batch = [self.queue.get()]
+                while len(batch) < self.batch_size:
+                    try:
+                        batch.append(self.queue.get_nowait())
+                    except queue.Empty:
+                        break
+                self._commit(conn, batch)
+        except Exception as e:
+            self._fail(e, batch)
+
+    def _fail(self, error, batch):
+        with self._lock:
+            self.error = error
+        with _writers_lock:
+            if _writers.get(self.db_path) is self:
+                del _writers[self.db_path]
+        # Nothing is queued after error is set, so this drains every waiter.
+        while True:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        for _, future in batch:
+            if not future.done():
+                future.set_exception(error)
+
+    def _commit(self, conn, batch):
+        outcomes = []
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            cursor = conn.cursor()
+            for fn, future in batch:
+                cursor.execute("SAVEPOINT write")
+                try:
+                    outcomes.append((future, fn(cursor), None))
+                except Exception as e:
+                    cursor.execute("ROLLBACK TO write")
+                    outcomes.append((future, None, e))
+                cursor.execute("RELEASE write")
+            conn.commit()
+        except Exception as e:
+            if conn.in_transaction:
+                conn.rollback()
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        for future, result, exception in outcomes:
+            if exception is None:
+                future.set_result(result)
+            else:
+                future.set_exception(exception)
+
+def _get_writer(db_path):
+    with _writers_lock:
+        writer = _writers.get(db_path)
+        if writer is None:
+            config = flask.current_app.config
+            writer = _writers[db_path] = _Writer(db_path, config.get("WRITE_BATCH_SIZE", WRITE_BATCH_SIZE),
+                                                 config.get("WRITE_TIMEOUT", WRITE_TIMEOUT))
+        return writer
+
+def write(fn):
+    """Run fn(cursor) as one atomic write and return its result.
+
+    With WRITE_QUEUE set, fn is handed to the database's writer thread and
+    group-committed with whatever other writes are waiting; otherwise it runs
+    in a transaction on the context's own connection. Either way an exception
+    from fn undoes its writes and is re-raised here. fn may run on another
+    thread, so it must take everything it needs from the request up front.
+    """
+    if flask.current_app.config.get("WRITE_QUEUE"):
+        return _get_writer(_db_path()).submit(fn)
+    with transaction(get_db()) as cursor:
+        return fn(cursor)
+
+def split_expense(amount, members, payer_id, weights=None):
+    """Return a (payer_id, member_id, cents) loan for every other member with a share.
 
+    amount is in integer cents. weights maps member_id to a non-negative
+    weight; members missing from it take no part in the split. Without
+    weights the split is equal.
+
+    Shares are floored and the leftover cents go one each to the members with
+    the largest fractional remainder, ties broken by member order, so the
+    shares (payer's included) always add up to amount exactly.
+    """
     if len(members) <= 1:
         raise ValueError("At least two members are required to split an expense.")
+    if not isinstance(amount, int):
+        raise ValueError("Amount must be integer cents.")
     if amount <= 0:
         raise ValueError("Amount must be positive.")
-    if not payer_id in [m["id"] for m in members]:
+    member_ids = [m["id"] for m in members]
+    if not payer_id in member_ids:
         raise ValueError("Payer must be a member of the group.")
-    
-    share = amount / len(members)
-    loans = []
-    for m in members:
-        if m["id"] != payer_id:
-            loans.append((payer_id, m["id"], share))
-    return loans
+
+    if weights is None:
+        weights = {member_id: 1 for member_id in member_ids}
+    if not set(weights) <= set(member_ids):
+        raise ValueError("Weights must only name members of the group.")
+    if any(not isinstance(w, (int, float)) or not math.isfinite(w) or w < 0 for w in weights.values()):
+        raise ValueError("Weights must be non-negative finite numbers.")
+    # Scale the weights to integers once, so each share and its remainder
+    # come from one exact divmod instead of Fraction arithmetic per member.
+    exact_weights = {member_id: Fraction(w) for member_id, w in weights.items()}
+    scale = math.lcm(*(w.denominator for w in exact_weights.values()))
+    int_weights = {member_id: w.numerator * (scale // w.denominator) for member_id, w in exact_weights.items()}
+    total = sum(int_weights.values())
+    if total <= 0:
+        raise ValueError("At least one member must have a positive weight.")
+
+    participants = [member_id for member_id in member_ids if weights.get(member_id)]
+    shares, remainders = {}, {}
+    for member_id in participants:
+        shares[member_id], remainders[member_id] = divmod(amount * int_weights[member_id], total)
+    leftover = amount - sum(shares.values())
+    by_remainder = sorted(participants, key=remainders.__getitem__, reverse=True)
+    for member_id in by_remainder[:leftover]:
+        shares[member_id] += 1
+
+    return [(payer_id, member_id, shares[member_id]) for member_id in participants if member_id != payer_id]
+
+def pack_shares(loans):
+    """Pack split_expense loans into the JSON object stored in transactions.shares."""
+    return json.dumps({str(payee_id): share for _, payee_id, share in loans}, separators=(",", ":"))
 
 def calculate_balances(loans, user_id, members):
+    """Return {member_id: cents} owed to user_id, computed from in-memory loans.
+
+    Validates and sums in a single pass; query_balances does the same work in
+    SQLite over stored transactions and settlements.
+    """
     if len(members) <= 1:
         raise ValueError("At least two members are required to calculate balances.")
-    if not loans:
-        return {member["id"]: 0 for member in members}
-    if not user_id in [m["id"] for m in members]:
+    balances = {member["id"]: 0 for member in members}
+    if user_id not in balances:
         raise ValueError("User must be a member of the group.")
-    if not all(k in loans[0] for k in ("payer_id", "payee_id", "amount")) and loans:
-        raise ValueError("Loans must have payer_id, payee_id, and amount fields.")
-    if not all(isinstance(l["amount"], (int, float)) for l in loans):
-        raise ValueError("Loan amounts must be numeric.")
-    if not all(l["amount"] > 0 for l in loans):
-        raise ValueError("Loan amounts must be positive.")
-    if not all(l["payer_id"] in [m["id"] for m in members] for l in loans):
-        raise ValueError("Payer must be a member of the group.")
-    if not all(l["payee_id"] in [m["id"] for m in members] for l in loans):
-        raise ValueError("Payee must be a member of the group.")
 
+    for loan in loans:
+        try:
+            payer_id, payee_id, amount = loan["payer_id"], loan["payee_id"], loan["amount"]
+        except (KeyError, IndexError):
+            raise ValueError("Loans must have payer_id, payee_id, and amount fields.")
+        if not isinstance(amount, (int, float)):
+            raise ValueError("Loan amounts must be numeric.")
+        if not isinstance(amount, int):
+            raise ValueError("Loan amounts must be integer cents.")
+        if amount <= 0:
+            raise ValueError("Loan amounts must be positive.")
+        if payer_id not in balances:
+            raise ValueError("Payer must be a member of the group.")
+        if payee_id not in balances:
+            raise ValueError("Payee must be a member of the group.")
+
+        if payer_id == user_id:
+            balances[payee_id] += amount
+        elif payee_id == user_id:
+            balances[payer_id] -= amount
+
+    return balances
+
+def query_balances(cursor, group_id, user_id, members):
+    """Return {member_id: cents} owed to user_id, aggregated by SQLite from the group's history.
+
+    Each transaction's packed shares are expanded with json_each; a settlement
+    from debtor to creditor counts as a loan in the opposite direction.
+    """
     balances = {member["id"]: 0 for member in members}
+    if user_id not in balances:
+        raise ValueError("User must be a member of the group.")
+    rows = cursor.execute("""
+        SELECT payer_id, payee_id, SUM(amount) AS total FROM (
+            SELECT transactions.payer_id, CAST(shares.key AS INTEGER) AS payee_id, shares.value AS amount
+            FROM transactions, json_each(transactions.shares) AS shares
+            WHERE transactions.group_id = ? AND (transactions.payer_id = ? OR shares.key = CAST(? AS TEXT))
+            UNION ALL
+            SELECT debtor_id, creditor_id, amount_cents FROM settlements
+            WHERE group_id = ? AND (debtor_id = ? OR creditor_id = ?)
+        ) GROUP BY payer_id, payee_id
+    """, (group_id, user_id, user_id, group_id, user_id, user_id)).fetchall()
+    for row in rows:
+        if row["payer_id"] == user_id and row["payee_id"] in balances:
+            balances[row["payee_id"]] += row["total"]
+        elif row["payee_id"] == user_id and row["payer_id"] in balances:
+            balances[row["payer_id"]] -= row["total"]
+    return balances
+
+def fetch_expenses(cursor, group_id, before=None, limit=EXPENSES_PAGE_SIZE):
+    """Return one page of a group's expenses, newest first, and the cursor for the next page.
+
+    Pages are keyed on (timestamp, id) rather than OFFSET, so each page is a
+    bounded range scan of the transactions_group_timestamp index however much
+    history sits before it. before is the cursor returned with the previous
+    page; the returned cursor is None on the last page.
+    """
+    query = """
+        SELECT transactions.id, transactions.payer_id, transactions.description, transactions.amount_cents,
+               transactions.timestamp, users.username AS added_by
+        FROM transactions LEFT JOIN users ON users.id = transactions.payer_id
+        WHERE transactions.group_id = ? AND users.deleted_at IS NULL
+    """
+    params = [group_id]
+    if before:
+        timestamp, _, transaction_id = before.rpartition("|")
+        if not timestamp or not transaction_id.isdecimal() or len(transaction_id) > 19 or int(transaction_id) > MAX_INTEGER:
+            raise ValueError("Invalid page cursor.")
+        query += " AND (transactions.timestamp, transactions.id) < (?, ?)"
+        params += [timestamp, int(transaction_id)]
+    query += " ORDER BY transactions.timestamp DESC, transactions.id DESC LIMIT ?"
+    # One extra row tells us whether another page follows.
+    rows = cursor.execute(query, (*params, limit + 1)).fetchall()
+    page = rows[:limit]
+    next_cursor = f"{page[-1]['timestamp']}|{page[-1]['id']}" if len(rows) > limit else None
+    return page, next_cursor
+
+def fts_query(text, group_id):
+    """Build an FTS5 MATCH expression finding text's words in one group's descriptions.
+
+    Every word is quoted, so user input can never be read as FTS5 syntax,
+    and the last one matches as a prefix for search-as-you-type. Raises
+    ValueError if text has no words.
+    """
+    words = re.findall(r"\w+", text)
+    if not words:
+        raise ValueError("Search must contain a word.")
+    terms = " ".join(f'"{word}"' for word in words)
+    return f'group_id : "{int(group_id)}" AND description : ({terms} *)'
+
+def search_expenses(cursor, group_id, text, min_cents=None, max_cents=None, since=None, until=None, page=1, limit=SEARCH_PAGE_SIZE):
+    """Return one page of a group's expenses matching text, best match first, and whether more follow.
+
+    The transactions_fts index narrows the search to matching rows of the
+    group before any transaction is read, so cost follows the number of
+    matches, not the size of the group. Amounts are cents; since and until
+    are dates, both inclusive. Raises ValueError for a page past what
+    SQLite's OFFSET can address.
+    """
+    if page < 1:
+        raise ValueError("Page must be positive.")
+    if (page - 1) * limit > MAX_INTEGER:
+        raise ValueError("Page is too large.")
+    query = """
+        SELECT transactions.id, transactions.payer_id, transactions.description, transactions.amount_cents,
+               transactions.timestamp, users.username AS added_by
+        FROM transactions_fts
+        JOIN transactions ON transactions.id = transactions_fts.rowid
+        LEFT JOIN users ON users.id = transactions.payer_id
+        WHERE transactions_fts MATCH ? AND users.deleted_at IS NULL
+    """
+    params = [fts_query(text, group_id)]
+    if min_cents is not None:
+        query += " AND transactions.amount_cents >= ?"
+        params.append(min_cents)
+    if max_cents is not None:
+        query += " AND transactions.amount_cents <= ?"
+        params.append(max_cents)
+    if since is not None:
+        query += " AND transactions.timestamp >= ?"
+        params.append(since.isoformat())
+    if until is not None and until < datetime.date.max:
+        query += " AND transactions.timestamp < ?"
+        params.append((until + datetime.timedelta(days=1)).isoformat())
+    query += " ORDER BY transactions_fts.rank, transactions.id DESC LIMIT ? OFFSET ?"
+    # One extra row tells us whether another page follows.
+    rows = cursor.execute(query, (*params, limit + 1, (page - 1) * limit)).fetchall()
+    return rows[:limit], len(rows) > limit
 
-    for loan in [l for l in loans if l["payer_id"] == user_id]:
-        balances[loan["payee_id"]] += loan["amount"]
+# Every export record has these fields; ones that do not apply to a record
+# type are empty. Balances are exported once per pair, debtor to creditor.
+EXPORT_FIELDS = ("record", "id", "timestamp", "from_id", "from_user", "to_id", "to_user", "description", "amount_cents", "shares")
 
-    for loan in [l for l in loans if l["payee_id"] == user_id]:
-        balances[loan["payer_id"]] -= loan["amount"]
+_EXPORT_QUERIES = (
+    ("transaction", """
+        SELECT transactions.id, transactions.timestamp, transactions.payer_id AS from_id, users.username AS from_user,
+               transactions.description, transactions.amount_cents, transactions.shares
+        FROM transactions LEFT JOIN users ON users.id = transactions.payer_id
+        WHERE transactions.group_id = ? AND users.deleted_at IS NULL
+        ORDER BY transactions.timestamp, transactions.id
+    """),
+    ("settlement", """
+        SELECT settlements.id, settlements.timestamp, settlements.debtor_id AS from_id, debtors.username AS from_user,
+               settlements.creditor_id AS to_id, creditors.username AS to_user, settlements.amount_cents
+        FROM settlements
+        LEFT JOIN users AS debtors ON debtors.id = settlements.debtor_id
+        LEFT JOIN users AS creditors ON creditors.id = settlements.creditor_id
+        WHERE settlements.group_id = ? AND debtors.deleted_at IS NULL AND creditors.deleted_at IS NULL
+        ORDER BY settlements.id
+    """),
+    ("balance", """
+        SELECT balances.debtor_id AS from_id, debtors.username AS from_user,
+               balances.creditor_id AS to_id, creditors.username AS to_user, balances.net_cents AS amount_cents
+        FROM balances
+        LEFT JOIN users AS debtors ON debtors.id = balances.debtor_id
+        LEFT JOIN users AS creditors ON creditors.id = balances.creditor_id
+        WHERE balances.group_id = ? AND balances.net_cents > 0
+    """),
+)
 
+def iter_ledger(conn, group_id, batch_size=EXPORT_BATCH_SIZE):
+    """Yield a group's transactions, then settlements, then outstanding balances as export records.
+
+    Rows come off the cursor batch_size at a time, so memory stays flat
+    however long the history is. Everything is read inside one read
+    transaction, so the balances match the history exported before them.
+    """
+    cursor = conn.cursor()
+    cursor.execute("BEGIN")
+    try:
+        for record, query in _EXPORT_QUERIES:
+            cursor.execute(query, (group_id,))
+            while rows := cursor.fetchmany(batch_size):
+                for row in rows:
+                    yield {"record": record, **dict(row)}
+    finally:
+        conn.rollback()
+
+def export_csv(records, chunk_size=64 * 1024):
+    """Encode export records as CSV, yielding text in chunks of about chunk_size characters."""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, EXPORT_FIELDS)
+    writer.writeheader()
+    for record in records:
+        writer.writerow(record)
+        if buffer.tell() >= chunk_size:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+def export_jsonl(records, chunk_size=64 * 1024):
+    """Encode export records as JSON lines, leaving out empty fields and unpacking shares."""
+    lines, size = [], 0
+    for record in records:
+        record = {key: value for key, value in record.items() if value is not None}
+        if "shares" in record:
+            record["shares"] = json.loads(record["shares"])
+        line = json.dumps(record, separators=(",", ":")) + "\n"
+        lines.append(line)
+        size += len(line)
+        if size >= chunk_size:
+            yield "".join(lines)
+            lines, size = [], 0
+    yield "".join(lines)
+
+def read_import_rows(stream, import_format):
+    """Yield (line_number, row) for each record of a CSV or JSON-lines text stream.
+
+    The stream is read one line at a time. A JSON line that does not decode
+    is yielded as None, for parse_import_row to reject.
+    """
+    if import_format == "csv":
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for line_number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            yield line_number, json.loads(line)
+        except (ValueError, RecursionError):
+            yield line_number, None
+
+def _parse_split(split, members):
+    # "alice:2; bob" or, from JSON, {"alice": 2, "bob": 1}; a name without a
+    # weight counts 1.
+    if isinstance(split, str):
+        entries = [entry.partition(":") for entry in split.split(";") if entry.strip()]
+        split = {name.strip(): weight.strip() or 1 for name, _, weight in entries}
+    if not isinstance(split, dict):
+        raise ValueError("Split must list member names.")
+    weights = {}
+    for name, weight in split.items():
+        if name not in members:
+            raise ValueError(f"{name} is not a member of the group.")
+        try:
+            weights[members[name]] = float(weight)
+        except (TypeError, ValueError, OverflowError):
+            raise ValueError("Split weights must be numbers.")
+        if not math.isfinite(weights[members[name]]):
+            raise ValueError("Split weights must be finite numbers.")
+    return weights
+
+def parse_import_row(row, members, default_payer_id=None):
+    """Validate one import row and return (payer_id, description, amount_cents, shares, timestamp).
+
+    members maps each member's username to their id. Rows have a
+    description and an amount, and optionally a payer (username, else
+    default_payer_id), a split (see _parse_split; blank splits equally) and
+    an ISO 8601 timestamp, converted to UTC. Raises ValueError saying what is wrong with the row.
+    """
+    if not isinstance(row, dict):
+        raise ValueError("Row is not a JSON object.")
+    description = str(row.get("description") or "").strip()
+    if not description:
+        raise ValueError("Description is required.")
+    try:
+        description.encode("utf-8")
+    except UnicodeEncodeError:
+        raise ValueError("Description is not valid text.")
+    amount = parse_cents(str(row.get("amount") or ""))
+    if amount <= 0:
+        raise ValueError("Amount must be positive.")
+
+    payer = str(row.get("payer") or "").strip()
+    payer_id = members.get(payer) if payer else default_payer_id
+    if payer_id is None:
+        raise ValueError(f"{payer} is not a member of the group." if payer else "Payer is required.")
+
+    split = row.get("split")
+    weights = _parse_split(split, members) if split else None
+    loans = split_expense(amount, [{"id": member_id} for member_id in members.values()], payer_id, weights)
+
+    timestamp = row.get("timestamp")
+    if timestamp:
+        try:
+            moment = datetime.datetime.fromisoformat(str(timestamp))
+            # Stored as UTC, like CURRENT_TIMESTAMP; times without an offset are taken as UTC.
+            if moment.tzinfo is not None:
+                moment = moment.astimezone(datetime.timezone.utc)
+            timestamp = moment.strftime("%Y-%m-%d %H:%M:%S")
+        except (ValueError, OverflowError):
+            raise ValueError("Timestamp must be an ISO 8601 date or date and time.")
+    return payer_id, description, amount, pack_shares(loans), timestamp or None
+
+def _insert_expenses(group_id, batch):
+    def insert(cursor):
+        # The write lock is held, so every id above this one is from the batch.
+        last_id = cursor.execute("SELECT COALESCE(MAX(id), 0) FROM transactions").fetchone()[0]
+        cursor.executemany("INSERT INTO transactions (group_id, payer_id, description, amount_cents, shares, timestamp) VALUES (?, ?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP))",
+                           [(group_id, *expense) for expense in batch])
+        apply_transactions_to_balances(cursor, "transactions.id > ?", (last_id,))
+        bump_group_version(cursor, group_id)
+    write(insert)
+
+def import_expenses(group_id, members, rows, default_payer_id=None, batch_size=IMPORT_BATCH_SIZE):
+    """Import (line_number, row) pairs into a group and return a summary.
+
+    Valid rows are written batch_size at a time, each batch one executemany
+    transaction with a single ledger update, so a long import never holds
+    the write lock for long. Invalid rows are skipped and reported; the
+    first IMPORT_MAX_ERRORS of them are listed with their line numbers. A
+    file that stops decoding (bad UTF-8, malformed CSV) ends the import at
+    that line, keeping the rows before it, and is reported the same way.
+    """
+    imported, failed, errors, batch = 0, 0, [], []
+
+    def reject(line_number, message):
+        nonlocal failed
+        failed += 1
+        if len(errors) < IMPORT_MAX_ERRORS:
+            errors.append({"line": line_number, "error": message})
+
+    line_number = 0
+    try:
+        for line_number, row in rows:
+            try:
+                batch.append(parse_import_row(row, members, default_payer_id))
+            except ValueError as e:
+                reject(line_number, str(e))
+                continue
+            if len(batch) >= batch_size:
+                _insert_expenses(group_id, batch)
+                imported += len(batch)
+                batch = []
+    except UnicodeDecodeError:
+        reject(line_number + 1, "File is not valid UTF-8; nothing from this line on was imported.")
+    except csv.Error as e:
+        reject(line_number + 1, f"CSV could not be parsed ({e}); nothing from this line on was imported.")
+    if batch:
+        _insert_expenses(group_id, batch)
+        imported += len(batch)
+    return {"imported": imported, "failed": failed, "errors": errors}
+
+def simplify_debts(net_positions):
+    """Return a near-minimal list of (debtor_id, creditor_id, cents) transfers that settle a group.
+
+    net_positions maps member_id to net cents: positive if the member is owed
+    money, negative if they owe. The largest debtor always pays the largest
+    creditor, so every transfer clears at least one member and there are at
+    most n - 1 of them. Runs in O(n log n).
+    """
+    if any(not isinstance(cents, int) for cents in net_positions.values()):
+        raise ValueError("Net positions must be integer cents.")
+    if sum(net_positions.values()) != 0:
+        raise ValueError("Net positions must sum to zero.")
+
+    # heapq is a min-heap, so amounts are negated to pop the largest first.
+    creditors = [(-cents, member_id) for member_id, cents in net_positions.items() if cents > 0]
+    debtors = [(cents, member_id) for member_id, cents in net_positions.items() if cents < 0]
+    heapq.heapify(creditors)
+    heapq.heapify(debtors)
+
+    transfers = []
+    while creditors and debtors:
+        credit, creditor_id = heapq.heappop(creditors)
+        debt, debtor_id = heapq.heappop(debtors)
+        amount = min(-credit, -debt)
+        transfers.append((debtor_id, creditor_id, amount))
+        if -credit > amount:
+            heapq.heappush(creditors, (credit + amount, creditor_id))
+        if -debt > amount:
+            heapq.heappush(debtors, (debt + amount, debtor_id))
+    return transfers
+
+def get_net_positions(cursor, group_id, members):
+    """Return {member_id: net cents} for every member, read from the balances ledger.
+
+    Anyone who still has ledger rows in the group is included, so the
+    positions always sum to zero.
+    """
+    positions = {member["id"]: 0 for member in members}
+    rows = cursor.execute("SELECT creditor_id, SUM(net_cents) AS net_cents FROM balances WHERE group_id = ? GROUP BY creditor_id", (group_id,)).fetchall()
+    for row in rows:
+        positions[row["creditor_id"]] = row["net_cents"]
+    return positions
+
+# Ledger rows are kept in antisymmetric pairs: for every (debtor, creditor)
+# row there is a (creditor, debtor) row holding the negated amount, so a
+# member's balances are found by looking up their creditor_id alone.
+_TRANSACTION_CENTS = """
+    SELECT transactions.group_id, CAST(shares.key AS INTEGER) AS debtor_id, transactions.payer_id AS creditor_id, shares.value AS cents
+    FROM transactions, json_each(transactions.shares) AS shares WHERE {condition}
+    UNION ALL
+    SELECT transactions.group_id, transactions.payer_id, CAST(shares.key AS INTEGER), -shares.value
+    FROM transactions, json_each(transactions.shares) AS shares WHERE {condition}
+"""
+
+_SETTLEMENT_CENTS = """
+    SELECT group_id, debtor_id, creditor_id, -amount_cents AS cents FROM settlements WHERE {condition}
+    UNION ALL
+    SELECT group_id, creditor_id, debtor_id, amount_cents FROM settlements WHERE {condition}
+"""
+
+def _ledger_delta(*parts):
+    return f"SELECT group_id, debtor_id, creditor_id, SUM(cents) AS net_cents FROM ({' UNION ALL '.join(parts)}) GROUP BY group_id, debtor_id, creditor_id"
+
+_UPSERT_BALANCE = """
+    INSERT INTO balances (group_id, debtor_id, creditor_id, net_cents) VALUES (?, ?, ?, ?)
+    ON CONFLICT(group_id, creditor_id, debtor_id) DO UPDATE SET net_cents = net_cents + excluded.net_cents
+"""
+
+def apply_transactions_to_balances(cursor, condition, params, sign=1):
+    """Add (sign=1) or subtract (sign=-1) the transactions matching condition to the balances ledger.
+
+    Must run in the same transaction as the writes it mirrors: after an
+    INSERT, before a DELETE.
+    """
+    delta = _ledger_delta(_TRANSACTION_CENTS.format(condition=condition))
+    cursor.execute(f"""
+        INSERT INTO balances (group_id, debtor_id, creditor_id, net_cents)
+        SELECT group_id, debtor_id, creditor_id, ? * net_cents FROM ({delta}) WHERE true
+        ON CONFLICT(group_id, creditor_id, debtor_id) DO UPDATE SET net_cents = net_cents + excluded.net_cents
+    """, (sign, *params, *params))
+
+def record_settlement(cursor, group_id, debtor_id, creditor_id, cents):
+    """Record that debtor_id paid creditor_id and reduce the debt between them in the ledger."""
+    cursor.execute("INSERT INTO settlements (group_id, debtor_id, creditor_id, amount_cents) VALUES (?, ?, ?, ?)", (group_id, debtor_id, creditor_id, cents))
+    cursor.executemany(_UPSERT_BALANCE, [(group_id, debtor_id, creditor_id, -cents), (group_id, creditor_id, debtor_id, cents)])
+
+def bump_group_version(cursor, group_id):
+    """Mark the group's data as changed; call in the same transaction as the write."""
+    cursor.execute("UPDATE groups SET version = version + 1 WHERE id = ?", (group_id,))
+
+def get_balances(cursor, group_id, user_id, members):
+    """Return {member_id: cents} owed to user_id by each member, read from the ledger."""
+    balances = {member["id"]: 0 for member in members}
+    rows = cursor.execute("SELECT debtor_id, net_cents FROM balances WHERE group_id = ? AND creditor_id = ?", (group_id, user_id)).fetchall()
+    for row in rows:
+        if row["debtor_id"] in balances:
+            balances[row["debtor_id"]] = row["net_cents"]
     return balances
+
+def get_group_summaries(cursor, user_id):
+    """Return the user's groups, each with their net balance and debt counts.
+
+    One pass over the ledger rows where the user is creditor: net_cents is
+    what the group owes the user overall (negative when the user owes),
+    debts counts members the user owes and credits members who owe the user.
+    """
+    return cursor.execute("""
+        SELECT groups.id, groups.name, memberships.group_creator,
+               COALESCE(SUM(balances.net_cents), 0) AS net_cents,
+               COUNT(CASE WHEN balances.net_cents < 0 THEN 1 END) AS debts,
+               COUNT(CASE WHEN balances.net_cents > 0 THEN 1 END) AS credits
+        FROM memberships
+        JOIN groups ON groups.id = memberships.group_id
+        LEFT JOIN balances ON balances.group_id = memberships.group_id AND balances.creditor_id = memberships.user_id
+        WHERE memberships.user_id = ? AND groups.deleted_at IS NULL
+        GROUP BY memberships.group_id
+    """, (user_id,)).fetchall()
+
+# Rows of tombstoned groups and users are left to the purge, which is still
+# deleting the history they were computed from.
+_LIVE_LEDGER_ROW = """
+    group_id NOT IN (SELECT id FROM groups WHERE deleted_at IS NOT NULL)
+    AND debtor_id NOT IN (SELECT id FROM users WHERE deleted_at IS NOT NULL)
+    AND creditor_id NOT IN (SELECT id FROM users WHERE deleted_at IS NOT NULL)
+"""
+
+def rebuild_balances(conn, check_only=False):
+    """Recompute the ledger from transactions and settlements and return the number of drifted rows.
+
+    Unless check_only is set, the ledger is replaced with the recomputed rows.
+    Tombstoned groups and users are skipped. The whole rebuild holds the
+    write lock, so no write can land between the snapshot and the replace.
+    """
+    with transaction(conn) as cursor:
+        cursor.execute("DROP TABLE IF EXISTS temp.expected_balances")
+        delta = _ledger_delta(_TRANSACTION_CENTS.format(condition="true"), _SETTLEMENT_CENTS.format(condition="true"))
+        cursor.execute(f"CREATE TEMP TABLE expected_balances AS SELECT * FROM ({delta}) WHERE {_LIVE_LEDGER_ROW}")
+        drift = 0
+        for left, right in (("expected_balances", "balances"), ("balances", "expected_balances")):
+            drift += cursor.execute(f"""
+                SELECT COUNT(*) FROM (
+                    SELECT group_id, debtor_id, creditor_id, net_cents FROM {left} WHERE net_cents != 0 AND {_LIVE_LEDGER_ROW}
+                    EXCEPT
+                    SELECT group_id, debtor_id, creditor_id, net_cents FROM {right} WHERE net_cents != 0
+                )
+            """).fetchone()[0]
+        if not check_only:
+            cursor.execute(f"DELETE FROM balances WHERE {_LIVE_LEDGER_ROW}")
+            cursor.execute("INSERT INTO balances (group_id, debtor_id, creditor_id, net_cents) SELECT group_id, debtor_id, creditor_id, net_cents FROM expected_balances WHERE net_cents != 0")
+        cursor.execute("DROP TABLE temp.expected_balances")
+    return drift
+
+def tombstone_group(cursor, group_id):
+    """Hide a group at once and queue the deletion of its rows for purge_step."""
+    cursor.execute("UPDATE groups SET deleted_at = CURRENT_TIMESTAMP, version = version + 1 WHERE id = ?", (group_id,))
+    cursor.execute("INSERT INTO purges (kind, target_id) VALUES ('group', ?)", (group_id,))
+
+def tombstone_user(cursor, user_id):
+    """Hide a user at once and queue the deletion of their history for purge_step.
+
+    The rows whose size is bounded by the user's group count go now: their
+    memberships, invites and the ledger rows they appear in. Their groups'
+    balances change, so the groups' versions are bumped too. The groups are
+    recorded with the purge, which only walks their history.
+    """
+    cursor.execute("UPDATE users SET deleted_at = CURRENT_TIMESTAMP WHERE id = ?", (user_id,))
+    cursor.execute("UPDATE groups SET version = version + 1 WHERE id IN (SELECT group_id FROM memberships WHERE user_id = ?)", (user_id,))
+    cursor.execute("DELETE FROM balances WHERE group_id IN (SELECT group_id FROM memberships WHERE user_id = ?) AND (creditor_id = ? OR debtor_id = ?)", (user_id, user_id, user_id))
+    cursor.execute("DELETE FROM invites WHERE sender_id = ? OR receiver_id = ?", (user_id, user_id))
+    cursor.execute("INSERT INTO purges (kind, target_id, group_ids) VALUES ('user', ?, (SELECT json_group_array(group_id) FROM memberships WHERE user_id = ?))", (user_id, user_id))
+    cursor.execute("DELETE FROM memberships WHERE user_id = ?", (user_id,))
+
+_GROUP_PURGE_STEPS = ("transactions", "settlements", "balances", "invites", "memberships")
+
+def _purge_group_batch(cursor, purge, batch_size):
+    for table in _GROUP_PURGE_STEPS:
+        deleted = cursor.execute(f"DELETE FROM {table} WHERE rowid IN (SELECT rowid FROM {table} WHERE group_id = ? LIMIT ?)", (purge["target_id"], batch_size)).rowcount
+        if deleted:
+            return deleted, False
+    cursor.execute("DELETE FROM groups WHERE id = ?", (purge["target_id"],))
+    return 1, True
+
+def _purge_user_batch(cursor, purge, batch_size):
+    user_id = purge["target_id"]
+    group_ids = json.loads(purge["group_ids"] or "[]")
+    if not group_ids:
+        cursor.execute("DELETE FROM users WHERE id = ?", (user_id,))
+        return 1, True
+    # Walk the first remaining group's transactions a batch at a time along
+    # transactions_group_timestamp: drop the ones the user paid and the
+    # user's share of everyone else's. Then their settlements in the group.
+    group_id = group_ids[0]
+    after, params = "", (group_id,)
+    if purge["last_timestamp"] is not None:
+        after, params = " AND (timestamp, id) > (?, ?)", (group_id, purge["last_timestamp"], purge["last_transaction_id"])
+    rows = cursor.execute(f"SELECT id, timestamp FROM transactions WHERE group_id = ?{after} ORDER BY timestamp, id LIMIT ?", (*params, batch_size)).fetchall()
+    if rows:
+        ids = json.dumps([row[0] for row in rows])
+        deleted = cursor.execute("DELETE FROM transactions WHERE id IN (SELECT value FROM json_each(?)) AND payer_id = ?", (ids, user_id)).rowcount
+        cursor.execute("UPDATE transactions SET shares = json_remove(shares, '$.\"' || ? || '\"') WHERE id IN (SELECT value FROM json_each(?)) AND json_type(shares, '$.\"' || ? || '\"') IS NOT NULL", (user_id, ids, user_id))
+        cursor.execute("UPDATE purges SET last_timestamp = ?, last_transaction_id = ? WHERE id = ?", (rows[-1][1], rows[-1][0], purge["id"]))
+        return deleted, False
+    deleted = cursor.execute("DELETE FROM settlements WHERE rowid IN (SELECT rowid FROM settlements WHERE group_id = ? AND (debtor_id = ? OR creditor_id = ?) LIMIT ?)", (group_id, user_id, user_id, batch_size)).rowcount
+    if deleted:
+        return deleted, False
+    cursor.execute("UPDATE purges SET group_ids = ?, last_timestamp = NULL, last_transaction_id = 0 WHERE id = ?", (json.dumps(group_ids[1:]), purge["id"]))
+    return 0, False
+
+def purge_step(conn, batch_size=PURGE_BATCH_SIZE):
+    """Purge one bounded batch for the oldest pending tombstone; return False when none is pending.
+
+    Every call is its own short BEGIN IMMEDIATE transaction, so other writers
+    get the lock between batches however large the group or account.
+    """
+    with transaction(conn) as cursor:
+        purge = cursor.execute("SELECT * FROM purges WHERE finished_at IS NULL ORDER BY id LIMIT 1").fetchone()
+        if purge is None:
+            return False
+        purge_batch = _purge_group_batch if purge["kind"] == "group" else _purge_user_batch
+        deleted, finished = purge_batch(cursor, purge, batch_size)
+        cursor.execute("UPDATE purges SET rows_deleted = rows_deleted + ?, finished_at = CASE WHEN ? THEN CURRENT_TIMESTAMP END WHERE id = ?", (deleted, finished, purge["id"]))
+    return True
+
+def purge_status(cursor, limit=20):
+    """Return the pending purges and the most recent finished ones, newest first."""
+    return cursor.execute("""
+        SELECT purges.*, json_array_length(group_ids) AS groups_left
+        FROM purges ORDER BY finished_at IS NULL DESC, id DESC LIMIT ?
+    """, (limit,)).fetchall()
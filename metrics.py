@@ -0,0 +1,188 @@
+"""Request and query instrumentation exposed in Prometheus text format.
+
+helpers._connect opens every connection with InstrumentedConnection, so each
+statement is timed no matter which route runs it. Per request, the number of
+queries and the time spent in them are collected on flask.g; start_request and
+finish_request fold them, with the request latency, into process-wide
+counters and histograms that render() serialises for /metrics.
+
+record_cache counts hits and misses of the fragment and template bytecode
+caches (see fragments.py) by cache name.
+
+Counters live in the worker process, so with several workers each one reports
+its own numbers and Prometheus sums them across scrape targets.
+"""
+import bisect
+import flask
+import logging
+import sqlite3
+import threading
+import time
+
+SLOW_QUERY_MS = 100
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+logger = logging.getLogger("fairsplit.slow_query")
+
+_lock = threading.Lock()
+_requests = {}
+_queries = {}
+_slow_queries = {}
+_cache_lookups = {}
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Cursor that times every statement it executes."""
+
+    def execute(self, sql, parameters=()):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            record_query(sql, time.perf_counter() - start)
+
+    def executemany(self, sql, seq_of_parameters):
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            record_query(sql, time.perf_counter() - start)
+
+    def executescript(self, sql_script):
+        start = time.perf_counter()
+        try:
+            return super().executescript(sql_script)
+        finally:
+            record_query(sql_script, time.perf_counter() - start)
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Connection whose cursors, including the implicit ones, are instrumented."""
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    # sqlite3.Connection.execute does not go through self.cursor().
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
+
+def _endpoint():
+    if flask.has_request_context():
+        return flask.request.endpoint or "none"
+    return "none"
+
+def record_query(sql, seconds):
+    """Account one statement to the current request and log it if slow."""
+    endpoint = _endpoint()
+    if flask.has_app_context():
+        flask.g.db_queries = flask.g.get("db_queries", 0) + 1
+        flask.g.db_seconds = flask.g.get("db_seconds", 0.0) + seconds
+        threshold = flask.current_app.config.get("SLOW_QUERY_MS", SLOW_QUERY_MS)
+    else:
+        threshold = SLOW_QUERY_MS
+    slow = threshold is not None and seconds * 1e3 >= threshold
+    with _lock:
+        count, total = _queries.get(endpoint, (0, 0.0))
+        _queries[endpoint] = (count + 1, total + seconds)
+        if slow:
+            _slow_queries[endpoint] = _slow_queries.get(endpoint, 0) + 1
+    if slow:
+        logger.warning("slow query on %s (%.1f ms): %s", endpoint, seconds * 1e3, " ".join(sql.split()))
+
+def start_request():
+    flask.g.request_start = time.perf_counter()
+    flask.g.db_queries = 0
+    flask.g.db_seconds = 0.0
+
+def finish_request(response):
+    """Observe the request's latency and optionally add a Server-Timing header."""
+    start = flask.g.get("request_start")
+    if start is None:
+        return response
+    seconds = time.perf_counter() - start
+    endpoint = _endpoint()
+    with _lock:
+        histogram = _requests.get(endpoint)
+        if histogram is None:
+            histogram = _requests[endpoint] = {"buckets": [0] * len(LATENCY_BUCKETS), "count": 0, "sum": 0.0}
+        index = bisect.bisect_left(LATENCY_BUCKETS, seconds)
+        if index < len(LATENCY_BUCKETS):
+            histogram["buckets"][index] += 1
+        histogram["count"] += 1
+        histogram["sum"] += seconds
+    if flask.current_app.config.get("SERVER_TIMING"):
+        queries, db_seconds = flask.g.get("db_queries", 0), flask.g.get("db_seconds", 0.0)
+        response.headers["Server-Timing"] = (
+            f'db;dur={db_seconds * 1e3:.2f};desc="{queries} queries", app;dur={seconds * 1e3:.2f}'
+        )
+    return response
+
+def record_cache(cache, hit):
+    """Count one lookup in the named cache as a hit or a miss."""
+    key = (cache, "hit" if hit else "miss")
+    with _lock:
+        _cache_lookups[key] = _cache_lookups.get(key, 0) + 1
+
+def reset():
+    """Forget everything collected so far."""
+    with _lock:
+        _requests.clear()
+        _queries.clear()
+        _slow_queries.clear()
+        _cache_lookups.clear()
+
+def _label(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def render():
+    """Return all metrics in the Prometheus text exposition format."""
+    with _lock:
+        requests = {endpoint: {"buckets": list(h["buckets"]), "count": h["count"], "sum": h["sum"]}
+                    for endpoint, h in _requests.items()}
+        queries = dict(_queries)
+        slow_queries = dict(_slow_queries)
+        cache_lookups = dict(_cache_lookups)
+
+    lines = [
+        "# HELP fairsplit_request_duration_seconds Request latency by endpoint.",
+        "# TYPE fairsplit_request_duration_seconds histogram",
+    ]
+    for endpoint, histogram in sorted(requests.items()):
+        label = _label(endpoint)
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS, histogram["buckets"]):
+            cumulative += count
+            lines.append(f'fairsplit_request_duration_seconds_bucket{{endpoint="{label}",le="{bound}"}} {cumulative}')
+        lines.append(f'fairsplit_request_duration_seconds_bucket{{endpoint="{label}",le="+Inf"}} {histogram["count"]}')
+        lines.append(f'fairsplit_request_duration_seconds_sum{{endpoint="{label}"}} {histogram["sum"]:.6f}')
+        lines.append(f'fairsplit_request_duration_seconds_count{{endpoint="{label}"}} {histogram["count"]}')
+
+    lines += [
+        "# HELP fairsplit_db_queries_total SQL statements executed, by endpoint.",
+        "# TYPE fairsplit_db_queries_total counter",
+    ]
+    for endpoint, (count, _) in sorted(queries.items()):
+        lines.append(f'fairsplit_db_queries_total{{endpoint="{_label(endpoint)}"}} {count}')
+    lines += [
+        "# HELP fairsplit_db_query_seconds_total Time spent executing SQL, by endpoint.",
+        "# TYPE fairsplit_db_query_seconds_total counter",
+    ]
+    for endpoint, (_, total) in sorted(queries.items()):
+        lines.append(f'fairsplit_db_query_seconds_total{{endpoint="{_label(endpoint)}"}} {total:.6f}')
+    lines += [
+        "# HELP fairsplit_db_slow_queries_total Statements slower than SLOW_QUERY_MS, by endpoint.",
+        "# TYPE fairsplit_db_slow_queries_total counter",
+    ]
+    for endpoint, count in sorted(slow_queries.items()):
+        lines.append(f'fairsplit_db_slow_queries_total{{endpoint="{_label(endpoint)}"}} {count}')
+    lines += [
+        "# HELP fairsplit_cache_lookups_total Fragment and template bytecode cache lookups, by cache and result.",
+        "# TYPE fairsplit_cache_lookups_total counter",
+    ]
+    for (cache, result), count in sorted(cache_lookups.items()):
+        lines.append(f'fairsplit_cache_lookups_total{{cache="{_label(cache)}",result="{result}"}} {count}')
+    return "\n".join(lines) + "\n"
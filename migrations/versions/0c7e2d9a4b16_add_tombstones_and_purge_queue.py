@@ -0,0 +1,41 @@
+"""add tombstones and purge queue
+
+Revision ID: 0c7e2d9a4b16
+Revises: f58e1a3c7d24
+Create Date: 2026-10-18 09:12:37.418205
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0c7e2d9a4b16'
+down_revision = 'f58e1a3c7d24'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('groups', sa.Column('deleted_at', sa.DateTime(), nullable=True))
+    op.add_column('users', sa.Column('deleted_at', sa.DateTime(), nullable=True))
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS purges(
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL CHECK(kind IN ('group', 'user')),
+            target_id INTEGER NOT NULL,
+            requested_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            finished_at DATETIME,
+            rows_deleted INTEGER NOT NULL DEFAULT 0,
+            last_transaction_id INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    op.execute("CREATE INDEX IF NOT EXISTS purges_pending ON purges(id) WHERE finished_at IS NULL")
+
+
+def downgrade():
+    op.execute("DROP TABLE IF EXISTS purges")
+    with op.batch_alter_table('users', table_kwargs={'sqlite_autoincrement': True}) as batch_op:
+        batch_op.drop_column('deleted_at')
+    with op.batch_alter_table('groups', table_kwargs={'sqlite_autoincrement': True}) as batch_op:
+        batch_op.drop_column('deleted_at')
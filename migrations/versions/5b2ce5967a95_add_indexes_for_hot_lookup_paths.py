@@ -0,0 +1,43 @@
+"""add indexes for hot lookup paths
+
+Revision ID: 5b2ce5967a95
+Revises:
+Create Date: 2026-10-18 03:25:58.869925
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b2ce5967a95'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+INDEXES = [
+    "CREATE UNIQUE INDEX IF NOT EXISTS memberships_user_group ON memberships(user_id, group_id)",
+    "CREATE INDEX IF NOT EXISTS memberships_group ON memberships(group_id)",
+    "CREATE INDEX IF NOT EXISTS transactions_group ON transactions(group_id)",
+    "CREATE INDEX IF NOT EXISTS invites_receiver_group ON invites(receiver_id, group_id)",
+    "CREATE INDEX IF NOT EXISTS loans_group_payer_payee ON loans(group_id, payer_id, payee_id)",
+    "CREATE INDEX IF NOT EXISTS loans_transaction ON loans(transaction_id)",
+]
+
+
+def upgrade():
+    # The unique index cannot be built while duplicate memberships exist;
+    # keep the oldest row of each (user_id, group_id) pair.
+    op.execute(
+        "DELETE FROM memberships WHERE id NOT IN "
+        "(SELECT MIN(id) FROM memberships GROUP BY user_id, group_id)"
+    )
+    for statement in INDEXES:
+        op.execute(statement)
+
+
+def downgrade():
+    for name in ("loans_transaction", "loans_group_payer_payee", "invites_receiver_group",
+                 "transactions_group", "memberships_group", "memberships_user_group"):
+        op.execute(f"DROP INDEX IF EXISTS {name}")
@@ -0,0 +1,52 @@
+"""add expense search index
+
+Revision ID: 9b3d5e7f1a20
+Revises: 0c7e2d9a4b16
+Create Date: 2026-10-18 11:40:15.207316
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9b3d5e7f1a20'
+down_revision = '0c7e2d9a4b16'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Contentless: descriptions stay in transactions and only the index is
+    # stored. group_id is indexed as a token so a search never leaves its group.
+    op.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS transactions_fts USING fts5(
+            group_id, description, content='', tokenize='unicode61 remove_diacritics 2'
+        )
+    """)
+    # Rank on the description alone; every row of a group matches group_id.
+    op.execute("INSERT INTO transactions_fts (transactions_fts, rank) VALUES ('rank', 'bm25(0.0, 1.0)')")
+    op.execute("""
+        CREATE TRIGGER IF NOT EXISTS transactions_fts_insert AFTER INSERT ON transactions BEGIN
+            INSERT INTO transactions_fts (rowid, group_id, description) VALUES (new.id, new.group_id, new.description);
+        END
+    """)
+    op.execute("""
+        CREATE TRIGGER IF NOT EXISTS transactions_fts_delete AFTER DELETE ON transactions BEGIN
+            INSERT INTO transactions_fts (transactions_fts, rowid, group_id, description) VALUES ('delete', old.id, old.group_id, old.description);
+        END
+    """)
+    op.execute("""
+        CREATE TRIGGER IF NOT EXISTS transactions_fts_update AFTER UPDATE OF group_id, description ON transactions BEGIN
+            INSERT INTO transactions_fts (transactions_fts, rowid, group_id, description) VALUES ('delete', old.id, old.group_id, old.description);
+            INSERT INTO transactions_fts (rowid, group_id, description) VALUES (new.id, new.group_id, new.description);
+        END
+    """)
+    op.execute("INSERT INTO transactions_fts (rowid, group_id, description) SELECT id, group_id, description FROM transactions")
+
+
+def downgrade():
+    op.execute("DROP TRIGGER IF EXISTS transactions_fts_update")
+    op.execute("DROP TRIGGER IF EXISTS transactions_fts_delete")
+    op.execute("DROP TRIGGER IF EXISTS transactions_fts_insert")
+    op.execute("DROP TABLE IF EXISTS transactions_fts")
@@ -0,0 +1,45 @@
+"""add balances ledger
+
+Revision ID: a3f1c8d2e4b7
+Revises: 5b2ce5967a95
+Create Date: 2026-10-18 04:02:11.402113
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3f1c8d2e4b7'
+down_revision = '5b2ce5967a95'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS balances(
+            group_id INTEGER NOT NULL,
+            debtor_id INTEGER NOT NULL,
+            creditor_id INTEGER NOT NULL,
+            net_cents INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (group_id, creditor_id, debtor_id),
+            FOREIGN KEY (group_id) REFERENCES groups(id),
+            FOREIGN KEY (debtor_id) REFERENCES users(id),
+            FOREIGN KEY (creditor_id) REFERENCES users(id)
+        )
+    """)
+    # Seed the ledger from existing loans; same arithmetic as helpers.rebuild_balances.
+    op.execute("DELETE FROM balances")
+    op.execute("""
+        INSERT INTO balances (group_id, debtor_id, creditor_id, net_cents)
+        SELECT group_id, debtor_id, creditor_id, SUM(cents) FROM (
+            SELECT group_id, payee_id AS debtor_id, payer_id AS creditor_id, CAST(ROUND(amount * 100) AS INTEGER) AS cents FROM loans
+            UNION ALL
+            SELECT group_id, payer_id, payee_id, -CAST(ROUND(amount * 100) AS INTEGER) FROM loans
+        ) GROUP BY group_id, debtor_id, creditor_id
+    """)
+
+
+def downgrade():
+    op.execute("DROP TABLE IF EXISTS balances")
@@ -0,0 +1,34 @@
+"""scope user purges to their groups
+
+Revision ID: b8e4f2a61c39
+Revises: 9b3d5e7f1a20
+Create Date: 2026-10-18 16:05:42.913870
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b8e4f2a61c39'
+down_revision = '9b3d5e7f1a20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('purges', sa.Column('last_timestamp', sa.DateTime(), nullable=True))
+    op.add_column('purges', sa.Column('group_ids', sa.Text(), nullable=True))
+    # The memberships of users already queued are gone, so their purges
+    # walk every group: restarting from the first is safe, as each batch
+    # only removes what is still there.
+    op.execute("""
+        UPDATE purges SET group_ids = (SELECT json_group_array(id) FROM groups), last_transaction_id = 0
+        WHERE kind = 'user' AND finished_at IS NULL
+    """)
+
+
+def downgrade():
+    with op.batch_alter_table('purges', table_kwargs={'sqlite_autoincrement': True}) as batch_op:
+        batch_op.drop_column('group_ids')
+        batch_op.drop_column('last_timestamp')
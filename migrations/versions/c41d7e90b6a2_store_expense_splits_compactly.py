@@ -0,0 +1,74 @@
+"""store expense splits compactly
+
+Revision ID: c41d7e90b6a2
+Revises: a3f1c8d2e4b7
+Create Date: 2026-10-18 05:14:37.118230
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c41d7e90b6a2'
+down_revision = 'a3f1c8d2e4b7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('transactions', sa.Column('shares', sa.Text(), nullable=False, server_default='{}'))
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS settlements(
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            group_id INTEGER NOT NULL,
+            debtor_id INTEGER NOT NULL,
+            creditor_id INTEGER NOT NULL,
+            amount REAL NOT NULL,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (group_id) REFERENCES groups(id),
+            FOREIGN KEY (debtor_id) REFERENCES users(id),
+            FOREIGN KEY (creditor_id) REFERENCES users(id)
+        )
+    """)
+    op.execute("CREATE INDEX IF NOT EXISTS settlements_group ON settlements(group_id)")
+    # Loans already removed by settling are simply absent from the packed
+    # shares, so the balances ledger is unchanged by the conversion.
+    op.execute("""
+        UPDATE transactions SET shares = (
+            SELECT json_group_object(CAST(payee_id AS TEXT), amount) FROM loans WHERE loans.transaction_id = transactions.id
+        )
+    """)
+    op.execute("DROP INDEX IF EXISTS loans_group_payer_payee")
+    op.execute("DROP INDEX IF EXISTS loans_transaction")
+    op.execute("DROP TABLE loans")
+
+
+def downgrade():
+    # Settlements have no loan representation; they are dropped, so balances
+    # must be rebuilt after downgrading.
+    op.execute("""
+        CREATE TABLE loans(
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            payer_id INTEGER NOT NULL,
+            payee_id INTEGER NOT NULL,
+            transaction_id INTEGER NOT NULL,
+            amount REAL NOT NULL,
+            group_id INTEGER NOT NULL,
+            FOREIGN KEY (payer_id) REFERENCES users(id),
+            FOREIGN KEY (payee_id) REFERENCES users(id),
+            FOREIGN KEY (transaction_id) REFERENCES transactions(id),
+            FOREIGN KEY (group_id) REFERENCES groups(id)
+        )
+    """)
+    op.execute("""
+        INSERT INTO loans (payer_id, payee_id, transaction_id, amount, group_id)
+        SELECT transactions.payer_id, CAST(shares.key AS INTEGER), transactions.id, shares.value, transactions.group_id
+        FROM transactions, json_each(transactions.shares) AS shares
+    """)
+    op.execute("CREATE INDEX IF NOT EXISTS loans_group_payer_payee ON loans(group_id, payer_id, payee_id)")
+    op.execute("CREATE INDEX IF NOT EXISTS loans_transaction ON loans(transaction_id)")
+    op.execute("DROP INDEX IF EXISTS settlements_group")
+    op.execute("DROP TABLE settlements")
+    with op.batch_alter_table('transactions', table_kwargs={'sqlite_autoincrement': True}) as batch_op:
+        batch_op.drop_column('shares')
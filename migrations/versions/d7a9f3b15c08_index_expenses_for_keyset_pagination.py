@@ -0,0 +1,27 @@
+"""index expenses for keyset pagination
+
+Revision ID: d7a9f3b15c08
+Revises: c41d7e90b6a2
+Create Date: 2026-10-18 05:52:04.631977
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd7a9f3b15c08'
+down_revision = 'c41d7e90b6a2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Leading with group_id, the new index also serves plain group lookups.
+    op.execute("CREATE INDEX IF NOT EXISTS transactions_group_timestamp ON transactions(group_id, timestamp, id)")
+    op.execute("DROP INDEX IF EXISTS transactions_group")
+
+
+def downgrade():
+    op.execute("CREATE INDEX IF NOT EXISTS transactions_group ON transactions(group_id)")
+    op.execute("DROP INDEX IF EXISTS transactions_group_timestamp")
@@ -0,0 +1,25 @@
+"""add group version counter
+
+Revision ID: e2b6c4a8f913
+Revises: d7a9f3b15c08
+Create Date: 2026-10-18 06:20:45.902114
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2b6c4a8f913'
+down_revision = 'd7a9f3b15c08'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('groups', sa.Column('version', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade():
+    with op.batch_alter_table('groups', table_kwargs={'sqlite_autoincrement': True}) as batch_op:
+        batch_op.drop_column('version')
@@ -0,0 +1,28 @@
+"""index invites for purges
+
+Revision ID: e61a9c2d7f58
+Revises: b8e4f2a61c39
+Create Date: 2026-10-18 18:20:11.604382
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e61a9c2d7f58'
+down_revision = 'b8e4f2a61c39'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Purging a group deletes its invites, and deleting an account the ones
+    # it sent; without these both scan the whole table under the write lock.
+    op.execute("CREATE INDEX IF NOT EXISTS invites_group ON invites(group_id)")
+    op.execute("CREATE INDEX IF NOT EXISTS invites_sender ON invites(sender_id)")
+
+
+def downgrade():
+    op.execute("DROP INDEX IF EXISTS invites_sender")
+    op.execute("DROP INDEX IF EXISTS invites_group")
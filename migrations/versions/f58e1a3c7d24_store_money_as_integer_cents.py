@@ -0,0 +1,44 @@
+"""store money as integer cents
+
+Revision ID: f58e1a3c7d24
+Revises: e2b6c4a8f913
+Create Date: 2026-10-18 06:47:29.550871
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f58e1a3c7d24'
+down_revision = 'e2b6c4a8f913'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Shares are rounded the same way the ledger always rounded them, so the
+    # balances table stays valid without a rebuild.
+    op.execute("""
+        UPDATE transactions SET
+            amount = ROUND(amount * 100),
+            shares = (SELECT json_group_object(key, CAST(ROUND(value * 100) AS INTEGER)) FROM json_each(transactions.shares))
+    """)
+    op.execute("UPDATE settlements SET amount = ROUND(amount * 100)")
+    with op.batch_alter_table('transactions', table_kwargs={'sqlite_autoincrement': True}) as batch_op:
+        batch_op.alter_column('amount', new_column_name='amount_cents', type_=sa.Integer(), existing_nullable=False)
+    with op.batch_alter_table('settlements', table_kwargs={'sqlite_autoincrement': True}) as batch_op:
+        batch_op.alter_column('amount', new_column_name='amount_cents', type_=sa.Integer(), existing_nullable=False)
+
+
+def downgrade():
+    with op.batch_alter_table('transactions', table_kwargs={'sqlite_autoincrement': True}) as batch_op:
+        batch_op.alter_column('amount_cents', new_column_name='amount', type_=sa.REAL(), existing_nullable=False)
+    with op.batch_alter_table('settlements', table_kwargs={'sqlite_autoincrement': True}) as batch_op:
+        batch_op.alter_column('amount_cents', new_column_name='amount', type_=sa.REAL(), existing_nullable=False)
+    op.execute("""
+        UPDATE transactions SET
+            amount = amount / 100.0,
+            shares = (SELECT json_group_object(key, value / 100.0) FROM json_each(transactions.shares))
+    """)
+    op.execute("UPDATE settlements SET amount = amount / 100.0")
@@ -0,0 +1,105 @@
+"""Password hashing on a bounded worker pool.
+
+werkzeug's scrypt and pbkdf2 spend their time in hashlib, which releases the
+GIL, so a small thread pool really does run hashes in parallel while the
+request threads stay free. At most PASSWORD_HASH_WORKERS hashes run at once
+and at most PASSWORD_HASH_QUEUE more may wait; a caller that cannot get a slot
+within PASSWORD_HASH_TIMEOUT seconds gets HashingBusy instead of tying up a
+request worker behind a login burst.
+
+PASSWORD_HASH_METHOD is any werkzeug method string ("scrypt",
+"pbkdf2:sha256:600000", ...). Hashes made with anything else are reported by
+needs_rehash so login can upgrade them.
+"""
+import concurrent.futures
+import flask
+import functools
+import os
+import threading
+import time
+from werkzeug.security import check_password_hash, generate_password_hash
+
+HASH_METHOD = "scrypt"
+HASH_WORKERS = os.cpu_count() or 2
+HASH_QUEUE = 32
+HASH_TIMEOUT = 10.0
+
+class HashingBusy(Exception):
+    """Raised when no hashing slot frees up within PASSWORD_HASH_TIMEOUT."""
+
+_pool = None
+_slots = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+_verify_seconds = None
+
+def _config(name, default):
+    return flask.current_app.config.get(name, default)
+
+def _get_pool():
+    global _pool, _slots, _pool_pid
+    with _pool_lock:
+        # A forked worker inherits the parent's executor but not its threads.
+        if _pool is None or _pool_pid != os.getpid():
+            workers = _config("PASSWORD_HASH_WORKERS", HASH_WORKERS)
+            _pool = concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix="fairsplit-hash")
+            _slots = threading.BoundedSemaphore(workers + _config("PASSWORD_HASH_QUEUE", HASH_QUEUE))
+            _pool_pid = os.getpid()
+        return _pool, _slots
+
+def _run(fn, *args):
+    pool, slots = _get_pool()
+    timeout = _config("PASSWORD_HASH_TIMEOUT", HASH_TIMEOUT)
+    if not slots.acquire(timeout=timeout):
+        raise HashingBusy
+    try:
+        return pool.submit(fn, *args).result()
+    finally:
+        slots.release()
+
+@functools.lru_cache
+def _method_prefix(method):
+    # werkzeug fills in default parameters, so "scrypt" is stored as
+    # "scrypt:32768:8:1"; hash once to learn the exact prefix.
+    return generate_password_hash("", method).split("$", 1)[0]
+
+def hash_password(password):
+    """Hash password with the configured method."""
+    return _run(generate_password_hash, password, _config("PASSWORD_HASH_METHOD", HASH_METHOD))
+
+def verify_password(pwhash, password):
+    """Return whether password matches pwhash."""
+    global _verify_seconds
+    start = time.perf_counter()
+    matched = _run(check_password_hash, pwhash, password)
+    # Only hashes of the current method say how long a real failure takes.
+    if not needs_rehash(pwhash):
+        elapsed = time.perf_counter() - start
+        _verify_seconds = elapsed if _verify_seconds is None else 0.9 * _verify_seconds + 0.1 * elapsed
+    return matched
+
+def needs_rehash(pwhash):
+    """Return whether pwhash was made with a method other than the configured one."""
+    return pwhash.split("$", 1)[0] != _method_prefix(_config("PASSWORD_HASH_METHOD", HASH_METHOD))
+
+def reject_unknown_user():
+    """Take as long as a failed login would, without doing the hashing.
+
+    Sleeps for the recent average verify time, so an unknown username is
+    indistinguishable by timing from a wrong password but costs no CPU. Until
+    a real verify has been timed, one is run against a throwaway hash.
+    """
+    if _verify_seconds is None:
+        verify_password(_dummy_hash(_config("PASSWORD_HASH_METHOD", HASH_METHOD)), "")
+        return
+    time.sleep(_verify_seconds)
+
+def preload():
+    """Compute the configured method's hash prefix and throwaway hash ahead of the first login."""
+    method = _config("PASSWORD_HASH_METHOD", HASH_METHOD)
+    _method_prefix(method)
+    _dummy_hash(method)
+
+@functools.lru_cache
+def _dummy_hash(method):
+    return generate_password_hash(os.urandom(16).hex(), method)
@@ -0,0 +1,95 @@
+"""SQLite storage for Flask-Limiter, shared by every worker on the host.
+
+Importing this module registers the ``sqlite`` scheme with limits, so
+
+    RATELIMIT_STORAGE_URI=sqlite:///instance/ratelimit.db
+
+makes all gunicorn workers count against the same table instead of each
+keeping its own in-memory counters. Paths follow SQLAlchemy's convention:
+three slashes for a relative path, four for an absolute one.
+
+Each hit is a single UPSERT ... RETURNING in autocommit mode on a database
+of its own, so limiter writes never wait on the app's write lock. Counters
+are disposable, so the file runs with synchronous = OFF. Expired rows are
+reset in place by the upsert and pruned in bulk every PRUNE_EVERY hits.
+"""
+import os
+import sqlite3
+import threading
+import time
+from limits.storage import Storage
+
+PRUNE_EVERY = 1_000
+
+_INCR = """
+    INSERT INTO rate_limits (key, count, expiry) VALUES (?, ?, ?)
+    ON CONFLICT (key) DO UPDATE SET
+        count = CASE WHEN expiry <= ? THEN excluded.count ELSE count + excluded.count END,
+        expiry = CASE WHEN expiry <= ? THEN excluded.expiry ELSE expiry END
+    RETURNING count
+"""
+
+class SQLiteStorage(Storage):
+    """Fixed-window counters in a SQLite table."""
+
+    STORAGE_SCHEME = ["sqlite"]
+
+    def __init__(self, uri, wrap_exceptions=False, **options):
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+        self.path = uri[len("sqlite:///"):]
+        if not self.path:
+            raise ValueError("sqlite rate limit storage needs a file path")
+        self._local = threading.local()
+        self._hits = 0
+        with self._connection() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS rate_limits (key TEXT PRIMARY KEY, count INTEGER NOT NULL, expiry REAL NOT NULL) WITHOUT ROWID")
+
+    @property
+    def base_exceptions(self):
+        return sqlite3.Error
+
+    def _connection(self):
+        # One connection per thread, reopened after a fork so workers never
+        # share the parent's file handle.
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = OFF")
+            conn.execute("PRAGMA busy_timeout = 5000")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def incr(self, key, expiry, amount=1):
+        now = time.time()
+        conn = self._connection()
+        count = conn.execute(_INCR, (key, amount, now + expiry, now, now)).fetchone()[0]
+        self._hits += 1
+        if self._hits % PRUNE_EVERY == 0:
+            conn.execute("DELETE FROM rate_limits WHERE expiry <= ?", (now,))
+        return count
+
+    def get(self, key):
+        row = self._connection().execute("SELECT count FROM rate_limits WHERE key = ? AND expiry > ?", (key, time.time())).fetchone()
+        return row[0] if row else 0
+
+    def get_expiry(self, key):
+        now = time.time()
+        row = self._connection().execute("SELECT expiry FROM rate_limits WHERE key = ? AND expiry > ?", (key, now)).fetchone()
+        return row[0] if row else now
+
+    def check(self):
+        try:
+            self._connection().execute("SELECT 1").fetchone()
+        except sqlite3.Error:
+            return False
+        return True
+
+    def reset(self):
+        return self._connection().execute("DELETE FROM rate_limits").rowcount
+
+    def clear(self, key):
+        self._connection().execute("DELETE FROM rate_limits WHERE key = ?", (key,))
@@ -1,12 +1,14 @@
 CREATE TABLE IF NOT EXISTS users (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     username TEXT NOT NULL UNIQUE,
-    hash TEXT NOT NULL
+    hash TEXT NOT NULL,
+    deleted_at DATETIME
 );
-CREATE TABLE IF NOT EXISTS sqlite_sequence(name,seq);
 CREATE TABLE IF NOT EXISTS groups (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
-    name TEXT NOT NULL
+    name TEXT NOT NULL,
+    version INTEGER NOT NULL DEFAULT 0,
+    deleted_at DATETIME
 );
 CREATE TABLE IF NOT EXISTS memberships (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -20,8 +22,9 @@ CREATE TABLE IF NOT EXISTS transactions (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     group_id INTEGER NOT NULL,
     payer_id INTEGER NOT NULL,
-    amount REAL NOT NULL,
+    amount_cents INTEGER NOT NULL,
     description TEXT,
+    shares TEXT NOT NULL DEFAULT '{}',
     timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY(group_id) REFERENCES groups(id),
     FOREIGN KEY(payer_id) REFERENCES users(id)
@@ -38,15 +41,57 @@ CREATE TABLE IF NOT EXISTS invites (
         FOREIGN KEY (receiver_id) REFERENCES users(id),
         FOREIGN KEY (group_id) REFERENCES groups(id)
 );
-CREATE TABLE IF NOT EXISTS loans(
+CREATE TABLE IF NOT EXISTS settlements(
         id INTEGER PRIMARY KEY AUTOINCREMENT,
-        payer_id INTEGER NOT NULL,
-        payee_id INTEGER NOT NULL,
-        transaction_id INTEGER NOT NULL,
-        amount REAL NOT NULL, 
         group_id INTEGER NOT NULL,
-        FOREIGN KEY (payer_id) REFERENCES users(id),
-        FOREIGN KEY (payee_id) REFERENCES users(id),
-        FOREIGN KEY (transaction_id) REFERENCES transactions(id),
-        FOREIGN KEY (group_id) REFERENCES groups(id)
-);
\ No newline at end of file
+        debtor_id INTEGER NOT NULL,
+        creditor_id INTEGER NOT NULL,
+        amount_cents INTEGER NOT NULL,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (group_id) REFERENCES groups(id),
+        FOREIGN KEY (debtor_id) REFERENCES users(id),
+        FOREIGN KEY (creditor_id) REFERENCES users(id)
+);
+CREATE UNIQUE INDEX IF NOT EXISTS memberships_user_group ON memberships(user_id, group_id);
+CREATE INDEX IF NOT EXISTS memberships_group ON memberships(group_id);
+CREATE INDEX IF NOT EXISTS transactions_group_timestamp ON transactions(group_id, timestamp, id);
+CREATE INDEX IF NOT EXISTS invites_receiver_group ON invites(receiver_id, group_id);
+CREATE INDEX IF NOT EXISTS invites_group ON invites(group_id);
+CREATE INDEX IF NOT EXISTS invites_sender ON invites(sender_id);
+CREATE INDEX IF NOT EXISTS settlements_group ON settlements(group_id);
+CREATE TABLE IF NOT EXISTS balances(
+        group_id INTEGER NOT NULL,
+        debtor_id INTEGER NOT NULL,
+        creditor_id INTEGER NOT NULL,
+        net_cents INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (group_id, creditor_id, debtor_id),
+        FOREIGN KEY (group_id) REFERENCES groups(id),
+        FOREIGN KEY (debtor_id) REFERENCES users(id),
+        FOREIGN KEY (creditor_id) REFERENCES users(id)
+);
+CREATE TABLE IF NOT EXISTS purges(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        kind TEXT NOT NULL CHECK(kind IN ('group', 'user')),
+        target_id INTEGER NOT NULL,
+        requested_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        finished_at DATETIME,
+        rows_deleted INTEGER NOT NULL DEFAULT 0,
+        last_transaction_id INTEGER NOT NULL DEFAULT 0,
+        last_timestamp DATETIME,
+        group_ids TEXT
+);
+CREATE INDEX IF NOT EXISTS purges_pending ON purges(id) WHERE finished_at IS NULL;
+CREATE VIRTUAL TABLE IF NOT EXISTS transactions_fts USING fts5(
+        group_id, description, content='', tokenize='unicode61 remove_diacritics 2'
+);
+INSERT INTO transactions_fts (transactions_fts, rank) VALUES ('rank', 'bm25(0.0, 1.0)');
+CREATE TRIGGER IF NOT EXISTS transactions_fts_insert AFTER INSERT ON transactions BEGIN
+        INSERT INTO transactions_fts (rowid, group_id, description) VALUES (new.id, new.group_id, new.description);
+END;
+CREATE TRIGGER IF NOT EXISTS transactions_fts_delete AFTER DELETE ON transactions BEGIN
+        INSERT INTO transactions_fts (transactions_fts, rowid, group_id, description) VALUES ('delete', old.id, old.group_id, old.description);
+END;
+CREATE TRIGGER IF NOT EXISTS transactions_fts_update AFTER UPDATE OF group_id, description ON transactions BEGIN
+        INSERT INTO transactions_fts (transactions_fts, rowid, group_id, description) VALUES ('delete', old.id, old.group_id, old.description);
+        INSERT INTO transactions_fts (rowid, group_id, description) VALUES (new.id, new.group_id, new.description);
+END;
@@ -0,0 +1,53 @@
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import sqlite3
+import pytest
+import app as fairsplit
+import helpers
+
+SCHEMA = os.path.join(os.path.dirname(__file__), "..", "schema.sql")
+PASSWORD = "Password1"
+# Cheap hashing, no background threads and nothing written outside the test's own database.
+CONFIG = {"SECRET_KEY": "test", "SESSION_BACKEND": "cookie", "WTF_CSRF_ENABLED": False, "RATELIMIT_ENABLED": False,
+          "PURGE_INTERVAL": 0, "PASSWORD_HASH_METHOD": "pbkdf2:sha256:1000", "TEMPLATE_CACHE_DIR": ""}
+
+@pytest.fixture
+def conn():
+    """An in-memory database with the current schema; modules override it to add their rows."""
+    conn = sqlite3.connect(":memory:")
+    conn.row_factory = sqlite3.Row
+    with open(SCHEMA) as f:
+        conn.executescript(f.read())
+    yield conn
+    conn.close()
+
+@pytest.fixture
+def make_app():
+    """Return make_app(**config): an app from create_app with the test settings and the schema loaded."""
+    def make(**config):
+        app = fairsplit.create_app({**CONFIG, **config})
+        with app.app_context():
+            with open(SCHEMA) as f:
+                helpers.get_db().executescript(f.read())
+        return app
+    return make
+
+@pytest.fixture
+def login():
+    """Return login(app, username): a test client logged in as username, registering them on first use."""
+    def log_in(app, username):
+        client = app.test_client()
+        client.post("/register", data={"username": username, "password": PASSWORD, "confirmation": PASSWORD})
+        assert client.post("/login", data={"username": username, "password": PASSWORD}).status_code == 302
+        return client
+    return log_in
+
+@pytest.fixture
+def group_app(tmp_path, make_app, login):
+    """An app where alice (user 1) created group 1 and bob (user 2) joined it."""
+    app = make_app(DATABASE=str(tmp_path / "fairsplit.db"))
+    alice, bob = login(app, "alice"), login(app, "bob")
+    alice.post("/groups/create", data={"groupname": "trip"})
+    alice.post("/groups/1/invite", data={"username": "bob"})
+    bob.post("/groups/accept", data={"invite_id": 1})
+    return app
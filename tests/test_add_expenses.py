@@ -1,7 +1,7 @@
 import sys, os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 import pytest
-from helpers import split_expense
+from helpers import pack_shares, parse_cents, split_expense
 
 def test_valid_split_three_members():
     members = [{"id": 1}, {"id": 2}, {"id": 3}]
@@ -26,7 +26,86 @@ def test_payer_not_in_group():
 def test_fractional_split():
     members = [{"id": 1}, {"id": 2}, {"id": 3}]
     loans = split_expense(100, members, 1)
-    assert loans == [(1, 2, pytest.approx(33.3333, rel=1e-4)),
-                     (1, 3, pytest.approx(33.3333, rel=1e-4))]
+    assert loans == [(1, 2, 33), (1, 3, 33)]
 
+def test_remainder_cents_follow_member_order():
+    members = [{"id": 1}, {"id": 2}, {"id": 3}, {"id": 4}]
+    loans = split_expense(1002, members, 4)
+    assert loans == [(4, 1, 251), (4, 2, 251), (4, 3, 250)]
 
+def test_shares_always_sum_to_amount():
+    # The payer takes no share here, so the loans must cover every cent.
+    members = [{"id": i} for i in range(1, 8)]
+    for amount in range(1, 500):
+        loans = split_expense(amount, members, 1, {i: i for i in range(2, 8)})
+        assert sum(share for _, _, share in loans) == amount
+
+def test_amount_must_be_cents():
+    members = [{"id": 1}, {"id": 2}]
+    with pytest.raises(ValueError, match="integer cents"):
+        split_expense(10.5, members, 1)
+
+
+
+def test_weighted_split():
+    members = [{"id": 1}, {"id": 2}, {"id": 3}]
+    loans = split_expense(100, members, 1, {1: 2, 2: 1, 3: 1})
+    assert loans == [(1, 2, 25), (1, 3, 25)]
+
+def test_weighted_split_skips_zero_weights():
+    members = [{"id": 1}, {"id": 2}, {"id": 3}]
+    loans = split_expense(90, members, 1, {1: 1, 2: 2})
+    assert loans == [(1, 2, 60)]
+
+def test_weights_must_name_members():
+    members = [{"id": 1}, {"id": 2}]
+    with pytest.raises(ValueError, match="Weights must only name members"):
+        split_expense(50, members, 1, {1: 1, 99: 1})
+
+def test_weights_must_not_be_negative():
+    members = [{"id": 1}, {"id": 2}]
+    with pytest.raises(ValueError, match="non-negative"):
+        split_expense(50, members, 1, {1: 1, 2: -1})
+
+@pytest.mark.parametrize("weight", [float("inf"), float("nan")])
+def test_weights_must_be_finite(weight):
+    members = [{"id": 1}, {"id": 2}]
+    with pytest.raises(ValueError, match="finite"):
+        split_expense(50, members, 1, {1: 1, 2: weight})
+
+def test_pack_shares():
+    assert pack_shares([(1, 2, 3000), (1, 3, 1250)]) == '{"2":3000,"3":1250}'
+
+def test_parse_cents():
+    assert parse_cents("12.34") == 1234
+    assert parse_cents("7") == 700
+    assert parse_cents(" 0.1 ") == 10
+
+def test_parse_cents_rejects_fractional_cents():
+    with pytest.raises(ValueError, match="two decimal places"):
+        parse_cents("1.005")
+
+def test_parse_cents_rejects_non_numbers():
+    for value in ("ten", "nan", "inf", ""):
+        with pytest.raises(ValueError, match="must be a number"):
+            parse_cents(value)
+
+@pytest.mark.parametrize("value", ["1e30", "1e1000000", "1e100000", "92233720368547758.08", "-92233720368547758.08"])
+def test_parse_cents_rejects_amounts_too_large_to_store(value):
+    with pytest.raises(ValueError, match="too large"):
+        parse_cents(value)
+
+def test_parse_cents_bounds():
+    assert parse_cents("92233720368547758.07") == 2**63 - 1
+    with pytest.raises(ValueError, match="two decimal places"):
+        parse_cents("1e-999999999")
+
+def test_route_rejects_huge_amounts(group_app, login):
+    alice = login(group_app, "alice")
+    assert alice.post("/groups/1/expenses/add", data={"description": "Taxi", "amount": "1e30"}).status_code == 403
+    assert alice.get("/groups/1/search?q=taxi&min_amount=1e30").status_code == 400
+
+def test_route_rejects_infinite_weight(group_app, login):
+    alice = login(group_app, "alice")
+    response = alice.post("/groups/1/expenses/add", data={"description": "Taxi", "amount": "10", "weight-1": "inf"})
+    assert response.status_code == 403
@@ -0,0 +1,55 @@
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import pytest
+import helpers
+
+def version(app, group_id=1):
+    with app.app_context():
+        return helpers.get_db().execute("SELECT version FROM groups WHERE id = ?", (group_id,)).fetchone()["version"]
+
+def test_balances_are_revalidated_with_a_weak_etag(group_app, login):
+    alice = login(group_app, "alice")
+    first = alice.get("/api/groups/1/balances")
+    assert first.status_code == 200 and first.headers["ETag"].startswith('W/"')
+    assert first.get_json()["balances"] == [{"member_id": 2, "username": "bob", "amount_cents": 0}]
+
+    cached = alice.get("/api/groups/1/balances", headers={"If-None-Match": first.headers["ETag"]})
+    assert cached.status_code == 304 and cached.headers["ETag"] == first.headers["ETag"] and not cached.data
+
+    alice.post("/groups/1/expenses/add", data={"description": "Taxi", "amount": "20"})
+    fresh = alice.get("/api/groups/1/balances", headers={"If-None-Match": first.headers["ETag"]})
+    assert fresh.status_code == 200 and fresh.headers["ETag"] != first.headers["ETag"]
+    assert fresh.get_json()["balances"][0]["amount_cents"] == 1000
+
+def test_etag_is_per_viewer(group_app, login):
+    alice, bob = login(group_app, "alice"), login(group_app, "bob")
+    etag = alice.get("/api/groups/1/balances").headers["ETag"]
+    assert bob.get("/api/groups/1/balances", headers={"If-None-Match": etag}).status_code == 200
+
+def test_non_members_get_404(group_app, login):
+    carol = login(group_app, "carol")
+    assert carol.get("/api/groups/1/balances").status_code == 404
+
+def test_every_write_bumps_the_group_version(group_app, login):
+    alice, bob, carol = login(group_app, "alice"), login(group_app, "bob"), login(group_app, "carol")
+    writes = [
+        lambda: alice.post("/groups/1/expenses/add", data={"description": "Taxi", "amount": "20"}),
+        lambda: bob.post("/groups/1/expenses/add", data={"description": "Lunch", "amount": "6"}),
+        lambda: bob.post("/groups/1/expenses/2/remove"),
+        lambda: alice.post("/groups/1/settle", data={"payee_id": 2}),
+        lambda: alice.post("/groups/1/invite", data={"username": "carol"}),
+        lambda: carol.post("/groups/accept", data={"invite_id": 2}),
+    ]
+    for write in writes:
+        before = version(group_app)
+        assert write().status_code == 302
+        assert version(group_app) == before + 1
+
+@pytest.mark.parametrize("path, data", [
+    ("/groups/1/expenses/add", {"description": "Taxi", "amount": "-1"}),
+    ("/groups/1/settle", {"payee_id": 2}),
+])
+def test_rejected_writes_keep_the_version(group_app, login, path, data):
+    before = version(group_app)
+    assert login(group_app, "alice").post(path, data=data).status_code >= 400
+    assert version(group_app) == before
@@ -0,0 +1,113 @@
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import gc
+import random
+import sqlite3
+import time
+import weakref
+import pytest
+import app as fairsplit
+import helpers
+
+def usernames(app):
+    with app.app_context():
+        return [row["username"] for row in helpers.get_db().execute("SELECT username FROM users")]
+
+def test_memory_databases_are_private_to_each_app(make_app, login):
+    first, second = make_app(DATABASE=":memory:"), make_app(DATABASE=":memory:")
+    login(first, "alice")
+    assert first.config["DATABASE"].startswith("file:")
+    assert usernames(first) == ["alice"] and usernames(second) == []
+
+def test_login_redirect_and_pages(tmp_path, make_app, login):
+    app = make_app(DATABASE=str(tmp_path / "fairsplit.db"))
+    response = app.test_client().get("/groups")
+    assert response.status_code == 302 and response.headers["Location"].startswith("/login")
+    client = login(app, "alice")
+    assert client.post("/groups/create", data={"groupname": "trip"}).status_code == 302
+    assert b"trip" in client.get("/groups").data
+
+def test_cookie_sessions_leave_sqlalchemy_unloaded(make_app):
+    app = make_app(DATABASE=":memory:")
+    assert "sqlalchemy" not in app.extensions and "migrate" not in app.extensions
+
+def test_server_side_sessions_use_the_same_database(tmp_path, make_app, login):
+    path = tmp_path / "fairsplit.db"
+    app = make_app(DATABASE=str(path), SESSION_BACKEND="sqlalchemy")
+    login(app, "alice")
+    with sqlite3.connect(path) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0] == 1
+
+def expire_sessions(path):
+    with sqlite3.connect(path) as conn:
+        conn.execute("UPDATE sessions SET expiry = '2000-01-01 00:00:00'")
+
+def session_count(path, condition="true"):
+    with sqlite3.connect(path) as conn:
+        return conn.execute(f"SELECT COUNT(*) FROM sessions WHERE {condition}").fetchone()[0]
+
+def test_session_cleanup_command_deletes_expired_sessions(tmp_path, make_app, login):
+    path = tmp_path / "fairsplit.db"
+    app = make_app(DATABASE=str(path), SESSION_BACKEND="sqlalchemy")
+    login(app, "alice")
+    login(app, "bob")
+    expire_sessions(path)
+    login(app, "carol")
+    assert session_count(path) == 3
+    result = app.test_cli_runner().invoke(args=["session_cleanup"])
+    assert result.exit_code == 0 and session_count(path) == 1
+    assert session_count(path, "expiry < '2001-01-01'") == 0
+
+def test_session_cleanup_every_n_requests(tmp_path, monkeypatch, make_app, login):
+    path = tmp_path / "fairsplit.db"
+    app = make_app(DATABASE=str(path), SESSION_BACKEND="sqlalchemy", SESSION_CLEANUP_N_REQUESTS=100)
+    assert "session_cleanup" not in app.cli.commands
+    login(app, "alice")
+    expire_sessions(path)
+    # Flask-Session cleans up when randint(0, N) comes up 0.
+    monkeypatch.setattr(random, "randint", lambda a, b: 0)
+    app.test_client().get("/login")
+    assert session_count(path, "expiry < '2001-01-01'") == 0
+
+def test_cookie_sessions_need_no_cleanup(make_app, login):
+    app = make_app(DATABASE=":memory:", SESSION_CLEANUP_N_REQUESTS=1)
+    assert "session_cleanup" not in app.cli.commands
+    assert login(app, "alice").get("/groups").status_code == 200
+
+def test_apps_with_sqlalchemy_can_be_collected(make_app):
+    app = make_app(DATABASE=":memory:", SESSION_BACKEND="sqlalchemy")
+    assert app in fairsplit._sqlalchemy_apps
+    ref = weakref.ref(app)
+    del app
+    gc.collect()
+    assert ref() is None
+
+def test_relative_database_path_is_made_absolute(tmp_path, monkeypatch, make_app):
+    monkeypatch.chdir(tmp_path)
+    app = make_app(DATABASE="fairsplit.db")
+    assert app.config["DATABASE"] == str(tmp_path / "fairsplit.db")
+    assert app.config["SQLALCHEMY_DATABASE_URI"] == f"sqlite:///{tmp_path / 'fairsplit.db'}"
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs fork")
+def test_forked_worker_opens_its_own_connections(tmp_path, make_app, login):
+    app = make_app(DATABASE=str(tmp_path / "fairsplit.db"), WRITE_QUEUE=True)
+    login(app, "alice")
+    pid = os.fork()
+    if pid == 0:
+        # The parent's pooled connections and writer thread are not usable
+        # here; a write must go through fresh ones instead of hanging.
+        try:
+            login(app, "bob")
+            os._exit(0 if usernames(app) == ["alice", "bob"] else 1)
+        except BaseException:
+            os._exit(1)
+    deadline = time.monotonic() + 10
+    while (result := os.waitpid(pid, os.WNOHANG)) == (0, 0) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    if result == (0, 0):
+        os.kill(pid, 9)
+        os.waitpid(pid, 0)
+        pytest.fail("write in the forked child hung")
+    assert os.waitstatus_to_exitcode(result[1]) == 0
+    login(app, "carol")
+    assert usernames(app) == ["alice", "bob", "carol"]
@@ -1,7 +1,9 @@
 import sys, os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import json
+import sqlite3
 import pytest
-from helpers import calculate_balances
+from helpers import calculate_balances, query_balances
 
 def test_balances_simple_case():
     members = [{"id": 1}, {"id": 2}, {"id": 3}]
@@ -45,6 +47,12 @@ def test_balances_negative_amount():
     with pytest.raises(ValueError, match="Loan amounts must be positive"):
         calculate_balances(loans, 1, members)
 
+def test_balances_fractional_amount():
+    members = [{"id": 1}, {"id": 2}]
+    loans = [{"payer_id": 1, "payee_id": 2, "amount": 10.5}]
+    with pytest.raises(ValueError, match="integer cents"):
+        calculate_balances(loans, 1, members)
+
 def test_balances_non_numeric_amount():
     members = [{"id": 1}, {"id": 2}]
     loans = [{"payer_id": 1, "payee_id": 2, "amount": "ten"}]
@@ -62,3 +70,29 @@ def test_balances_payee_not_in_group():
     loans = [{"payer_id": 1, "payee_id": 3, "amount": 10}]
     with pytest.raises(ValueError, match="Payee must be a member"):
         calculate_balances(loans, 1, members)
+
+def test_query_balances_matches_python():
+    members = [{"id": 1}, {"id": 2}, {"id": 3}]
+    transactions = [
+        (1, {2: 3000, 3: 3000}),
+        (2, {1: 1250}),
+        (3, {2: 700}),
+    ]
+    loans = [{"payer_id": payer, "payee_id": payee, "amount": amount}
+             for payer, shares in transactions for payee, amount in shares.items()]
+    conn = sqlite3.connect(":memory:")
+    conn.row_factory = sqlite3.Row
+    conn.execute("CREATE TABLE transactions (group_id INTEGER, payer_id INTEGER, shares TEXT)")
+    conn.execute("CREATE TABLE settlements (group_id INTEGER, debtor_id INTEGER, creditor_id INTEGER, amount_cents INTEGER)")
+    conn.executemany("INSERT INTO transactions VALUES (1, ?, ?)", [(payer, json.dumps(shares)) for payer, shares in transactions])
+    conn.execute("INSERT INTO transactions VALUES (2, 1, ?)", (json.dumps({2: 9900}),))
+    conn.execute("INSERT INTO settlements VALUES (1, 3, 1, 1000)")
+    # A settlement from 3 to 1 nets out like a loan in the opposite direction.
+    loans.append({"payer_id": 3, "payee_id": 1, "amount": 1000})
+    for user_id in (1, 2, 3):
+        assert query_balances(conn.cursor(), 1, user_id, members) == calculate_balances(loans, user_id, members)
+
+def test_query_balances_invalid_user():
+    conn = sqlite3.connect(":memory:")
+    with pytest.raises(ValueError, match="User must be a member"):
+        query_balances(conn.cursor(), 1, 3, [{"id": 1}, {"id": 2}])
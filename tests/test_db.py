@@ -0,0 +1,150 @@
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import concurrent.futures
+import sqlite3
+import threading
+import time
+import flask
+import pytest
+import helpers
+
+@pytest.fixture
+def app(tmp_path):
+    app = flask.Flask(__name__)
+    app.config["DATABASE"] = str(tmp_path / "test.db")
+    app.teardown_appcontext(helpers.close_db)
+    return app
+
+def test_same_connection_within_context(app):
+    with app.app_context():
+        assert helpers.get_db() is helpers.get_db()
+
+def test_connection_returned_to_pool(app):
+    with app.app_context():
+        first = helpers.get_db()
+    with app.app_context():
+        assert helpers.get_db() is first
+
+def test_pragmas_applied(app):
+    with app.app_context():
+        conn = helpers.get_db()
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1
+        assert conn.execute("PRAGMA busy_timeout").fetchone()[0] == 5000
+
+def test_uncommitted_work_discarded_on_teardown(app):
+    with app.app_context():
+        conn = helpers.get_db()
+        conn.execute("CREATE TABLE t (x INTEGER)")
+        conn.commit()
+        conn.execute("INSERT INTO t (x) VALUES (1)")
+    with app.app_context():
+        assert helpers.get_db().execute("SELECT COUNT(*) FROM t").fetchone()[0] == 0
+
+def test_pool_is_bounded(app):
+    app.config["DATABASE_POOL_SIZE"] = 1
+    app.config["DATABASE"] += ".bounded"
+    with app.app_context():
+        first = helpers.get_db()
+        with app.app_context():
+            second = helpers.get_db()
+            assert second is not first
+    with app.app_context():
+        assert helpers.get_db() is second
+
+def test_transaction_commits(app):
+    with app.app_context():
+        conn = helpers.get_db()
+        conn.execute("CREATE TABLE t (x INTEGER)")
+        with helpers.transaction(conn) as cursor:
+            cursor.executemany("INSERT INTO t (x) VALUES (?)", [(1,), (2,)])
+        assert not conn.in_transaction
+        assert conn.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 2
+
+def test_transaction_rolls_back_on_error(app):
+    with app.app_context():
+        conn = helpers.get_db()
+        conn.execute("CREATE TABLE t (x INTEGER)")
+        with pytest.raises(RuntimeError):
+            with helpers.transaction(conn) as cursor:
+                cursor.execute("INSERT INTO t (x) VALUES (1)")
+                raise RuntimeError
+        assert conn.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 0
+
+def test_write_commits_and_returns(app):
+    with app.app_context():
+        helpers.get_db().execute("CREATE TABLE t (x INTEGER)")
+        assert helpers.write(lambda cursor: cursor.execute("INSERT INTO t (x) VALUES (1)").lastrowid) == 1
+    with app.app_context():
+        assert helpers.get_db().execute("SELECT COUNT(*) FROM t").fetchone()[0] == 1
+
+def test_write_queue_commits_concurrent_writes(app):
+    app.config["WRITE_QUEUE"] = True
+    app.config["DATABASE"] += ".queued"
+    with app.app_context():
+        helpers.get_db().execute("CREATE TABLE t (x INTEGER)")
+
+    def insert(x):
+        with app.app_context():
+            helpers.write(lambda cursor: cursor.execute("INSERT INTO t (x) VALUES (?)", (x,)))
+
+    threads = [threading.Thread(target=insert, args=(x,)) for x in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    with app.app_context():
+        assert helpers.get_db().execute("SELECT COUNT(*) FROM t").fetchone()[0] == 20
+
+def test_write_queue_isolates_failures_within_a_batch(app):
+    app.config["WRITE_QUEUE"] = True
+    app.config["DATABASE"] += ".isolated"
+    with app.app_context():
+        helpers.get_db().execute("CREATE TABLE t (x INTEGER)")
+        writer = helpers._get_writer(app.config["DATABASE"])
+
+    # Hold the writer on a first write so the next ones queue up behind it
+    # and are committed together.
+    started, release = threading.Event(), threading.Event()
+    def block(cursor):
+        started.set()
+        release.wait(5)
+    def fail(cursor):
+        cursor.execute("INSERT INTO t (x) VALUES (2)")
+        raise ValueError("boom")
+    futures = []
+    with concurrent.futures.ThreadPoolExecutor(3) as pool:
+        futures.append(pool.submit(writer.submit, block))
+        assert started.wait(5)
+        futures.append(pool.submit(writer.submit, lambda cursor: cursor.execute("INSERT INTO t (x) VALUES (1)")))
+        futures.append(pool.submit(writer.submit, fail))
+        while writer.queue.qsize() < 2:
+            time.sleep(0.001)
+        release.set()
+    with pytest.raises(ValueError):
+        futures[2].result()
+    with app.app_context():
+        assert [row[0] for row in helpers.get_db().execute("SELECT x FROM t")] == [1]
+
+def test_write_queue_fails_writes_when_the_writer_cannot_connect(app, tmp_path):
+    app.config["WRITE_QUEUE"] = True
+    app.config["DATABASE"] = str(tmp_path / "missing" / "test.db")
+    with app.app_context():
+        writer = helpers._get_writer(app.config["DATABASE"])
+        with pytest.raises(sqlite3.OperationalError):
+            helpers.write(lambda cursor: cursor.execute("SELECT 1"))
+        writer.thread.join(5)
+        assert app.config["DATABASE"] not in helpers._writers
+        # The directory now exists, so a fresh writer takes over.
+        (tmp_path / "missing").mkdir()
+        assert helpers.write(lambda cursor: cursor.execute("SELECT 1").fetchone()[0]) == 1
+        assert helpers._get_writer(app.config["DATABASE"]) is not writer
+
+def test_write_queue_wait_is_bounded(app):
+    app.config.update(WRITE_QUEUE=True, WRITE_TIMEOUT=0.05)
+    app.config["DATABASE"] += ".timeout"
+    release = threading.Event()
+    with app.app_context():
+        with pytest.raises(concurrent.futures.TimeoutError):
+            helpers.write(lambda cursor: release.wait(5))
+        release.set()
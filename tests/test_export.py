@@ -0,0 +1,68 @@
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import csv
+import io
+import json
+import pytest
+from helpers import (EXPORT_FIELDS, apply_transactions_to_balances, export_csv, export_jsonl, iter_ledger, pack_shares,
+                     record_settlement, tombstone_user)
+
+@pytest.fixture
+def conn(conn):
+    conn.executemany("INSERT INTO users (id, username, hash) VALUES (?, ?, 'x')", [(1, "a"), (2, "b"), (3, "c")])
+    conn.executemany("INSERT INTO groups (id, name) VALUES (?, ?)", [(1, "trip"), (2, "flat")])
+    for group_id, payer_id, loans in [(1, 1, [(1, 2, 1000), (1, 3, 1000)]), (1, 2, [(2, 1, 500)]), (2, 1, [(1, 2, 700)])]:
+        cursor = conn.execute("INSERT INTO transactions (group_id, payer_id, amount_cents, description, shares) VALUES (?, ?, ?, 'dinner, drinks', ?)",
+                              (group_id, payer_id, sum(cents for _, _, cents in loans), pack_shares(loans)))
+        apply_transactions_to_balances(conn.cursor(), "transactions.id = ?", (cursor.lastrowid,))
+    record_settlement(conn.cursor(), 1, 3, 1, 400)
+    conn.commit()
+    return conn
+
+def test_ledger_records(conn):
+    records = list(iter_ledger(conn, 1))
+    assert [record["record"] for record in records] == ["transaction", "transaction", "settlement", "balance", "balance"]
+    assert records[0]["from_user"] == "a" and json.loads(records[0]["shares"]) == {"2": 1000, "3": 1000}
+    assert records[2]["from_id"] == 3 and records[2]["to_id"] == 1 and records[2]["amount_cents"] == 400
+    balances = {(record["from_id"], record["to_id"]): record["amount_cents"] for record in records[3:]}
+    assert balances == {(2, 1): 500, (3, 1): 600}
+    assert not conn.in_transaction
+
+def test_tombstoned_users_are_left_out(conn):
+    conn.execute("INSERT INTO memberships (user_id, group_id, group_creator) VALUES (3, 1, 0)")
+    tombstone_user(conn.cursor(), 3)
+    conn.commit()
+    records = list(iter_ledger(conn, 1))
+    assert [record["record"] for record in records] == ["transaction", "transaction", "balance"]
+
+def test_route_streams_members_an_attachment(group_app, login):
+    alice = login(group_app, "alice")
+    alice.post("/groups/1/expenses/add", data={"description": "dinner, drinks", "amount": "20"})
+    response = alice.get("/groups/1/export.csv")
+    assert response.status_code == 200 and response.mimetype == "text/csv"
+    assert response.headers["Content-Disposition"] == "attachment; filename=fairsplit-group-1.csv"
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert [row["record"] for row in rows] == ["transaction", "balance"] and rows[0]["description"] == "dinner, drinks"
+    assert login(group_app, "bob").get("/groups/1/export.jsonl").headers["Content-Disposition"] == "attachment; filename=fairsplit-group-1.jsonl"
+
+def test_route_refuses_non_members(group_app, login):
+    carol = login(group_app, "carol")
+    assert carol.get("/groups/1/export.csv").status_code == 403
+    assert carol.get("/groups/1/export.jsonl").status_code == 403
+
+def test_batch_size_does_not_change_records(conn):
+    assert list(iter_ledger(conn, 1, batch_size=1)) == list(iter_ledger(conn, 1))
+
+def test_csv_round_trip(conn):
+    text = "".join(export_csv(iter_ledger(conn, 1), chunk_size=10))
+    rows = list(csv.DictReader(io.StringIO(text)))
+    assert tuple(rows[0]) == EXPORT_FIELDS
+    assert len(rows) == 5 and rows[0]["description"] == "dinner, drinks" and rows[0]["to_id"] == ""
+
+def test_jsonl_drops_empty_fields(conn):
+    lines = [json.loads(line) for line in "".join(export_jsonl(iter_ledger(conn, 2))).splitlines()]
+    assert lines == [
+        {"record": "transaction", "id": 3, "timestamp": lines[0]["timestamp"], "from_id": 1, "from_user": "a",
+         "description": "dinner, drinks", "amount_cents": 700, "shares": {"2": 700}},
+        {"record": "balance", "from_id": 2, "from_user": "b", "to_id": 1, "to_user": "a", "amount_cents": 700},
+    ]
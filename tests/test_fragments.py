@@ -0,0 +1,79 @@
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import re
+import pytest
+import fragments
+import metrics
+
+def lookups(cache, result):
+    match = re.search(rf'fairsplit_cache_lookups_total{{cache="{cache}",result="{result}"}} (\d+)', metrics.render())
+    return int(match.group(1)) if match else 0
+
+@pytest.fixture
+def app(group_app):
+    metrics.reset()
+    yield group_app
+    metrics.reset()
+
+def test_lru_evicts_least_recently_used():
+    cache = fragments.FragmentCache(maxsize=2)
+    cache.set(("f", 1), "one")
+    cache.set(("f", 2), "two")
+    assert cache.get(("f", 1)) == "one"
+    cache.set(("f", 3), "three")
+    assert cache.get(("f", 2)) is None
+    assert cache.get(("f", 1)) == "one" and cache.get(("f", 3)) == "three"
+    assert len(cache) == 2
+
+def test_zero_size_disables_caching():
+    cache = fragments.FragmentCache(maxsize=0)
+    cache.set(("f", 1), "one")
+    assert cache.get(("f", 1)) is None and len(cache) == 0
+
+def test_second_view_is_served_from_cache(app, login):
+    alice = login(app, "alice")
+    first = alice.get("/groups/1").text
+    assert lookups("group_members", "hit") == 0
+    second = alice.get("/groups/1").text
+    assert lookups("group_members", "hit") == 1 and lookups("group_expenses", "hit") == 1
+    assert len(app.extensions["fairsplit"]["fragments"]) == 2
+    # Only the CSRF tokens may differ between the rendered and cached pages.
+    assert re.sub(r'value="[^"]*"', "", first) == re.sub(r'value="[^"]*"', "", second)
+
+def test_writes_invalidate_the_group_fragments(app, login):
+    alice, bob = login(app, "alice"), login(app, "bob")
+    alice.get("/groups/1")
+    alice.post("/groups/1/expenses/add", data={"description": "Museum tickets", "amount": "30"})
+    page = alice.get("/groups/1").text
+    assert "Museum tickets" in page and "bob owes you $15.00" in page
+    bob.get("/groups/1")
+    bob.post("/groups/1/expenses/add", data={"description": "Dinner", "amount": "10"})
+    alice.post("/groups/1/settle", data={"payee_id": 2})
+    page = alice.get("/groups/1").text
+    assert "Dinner" in page and "owes you" not in page and "Settled up" not in page
+
+def test_fragments_are_per_viewer(app, login):
+    alice, bob = login(app, "alice"), login(app, "bob")
+    alice.post("/groups/1/expenses/add", data={"description": "Museum tickets", "amount": "30"})
+    assert "bob owes you $15.00" in alice.get("/groups/1").text
+    page = bob.get("/groups/1").text
+    assert "You owe $15.00 to alice" in page and "/expenses/1/remove" not in page
+
+def test_cached_fragments_carry_the_viewers_csrf_token(app, login):
+    alice = login(app, "alice")
+    alice.post("/groups/1/expenses/add", data={"description": "Museum tickets", "amount": "30"})
+    alice.get("/groups/1")
+    page = login(app, "alice").get("/groups/1").text
+    assert fragments.CSRF_PLACEHOLDER not in page
+    # The search form is rendered outside the fragments on every request.
+    token = re.search(r'data-csrf="([^"]+)"', page).group(1)
+    assert set(re.findall(r'name="csrf_token" value="([^"]+)"', page)) == {token}
+
+def test_bytecode_cache_survives_a_new_app(tmp_path, make_app):
+    metrics.reset()
+    config = {"DATABASE": ":memory:", "TEMPLATE_CACHE_DIR": str(tmp_path / "jinja")}
+    make_app(**config).test_client().get("/login")
+    assert lookups("jinja_bytecode", "miss") > 0 and lookups("jinja_bytecode", "hit") == 0
+    make_app(**config).test_client().get("/login")
+    assert lookups("jinja_bytecode", "hit") > 0
+    metrics.reset()
@@ -0,0 +1,98 @@
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import io
+import json
+import flask
+import pytest
+import helpers
+
+SCHEMA = os.path.join(os.path.dirname(__file__), "..", "schema.sql")
+MEMBERS = {"a": 1, "b": 2, "c": 3}
+
+@pytest.fixture
+def app(tmp_path):
+    app = flask.Flask(__name__)
+    app.config["DATABASE"] = str(tmp_path / "test.db")
+    app.teardown_appcontext(helpers.close_db)
+    with app.app_context():
+        conn = helpers.get_db()
+        with open(SCHEMA) as f:
+            conn.executescript(f.read())
+        conn.executemany("INSERT INTO users (id, username, hash) VALUES (?, ?, 'x')", [(1, "a"), (2, "b"), (3, "c")])
+        conn.execute("INSERT INTO groups (id, name) VALUES (1, 'trip')")
+        conn.executemany("INSERT INTO memberships (user_id, group_id, group_creator) VALUES (?, 1, ?)", [(1, 1), (2, 0), (3, 0)])
+        conn.commit()
+    return app
+
+def test_parse_row_defaults():
+    payer_id, description, amount, shares, timestamp = helpers.parse_import_row({"description": "taxi", "amount": "9.00"}, MEMBERS, 1)
+    assert (payer_id, description, amount, timestamp) == (1, "taxi", 900, None)
+    assert json.loads(shares) == {"2": 300, "3": 300}
+
+def test_parse_row_payer_split_and_timestamp():
+    row = {"description": "hotel", "amount": "30", "payer": "b", "split": "a:2; b", "timestamp": "2024-03-01"}
+    payer_id, _, amount, shares, timestamp = helpers.parse_import_row(row, MEMBERS)
+    assert (payer_id, amount, timestamp) == (2, 3000, "2024-03-01 00:00:00")
+    assert json.loads(shares) == {"1": 2000}
+
+@pytest.mark.parametrize("value, stored", [
+    ("2024-01-01T23:00:00-05:00", "2024-01-02 04:00:00"),
+    ("2024-01-01T23:00:00Z", "2024-01-01 23:00:00"),
+    ("2024-01-01 23:00:00", "2024-01-01 23:00:00"),
+])
+def test_parse_row_converts_timestamps_to_utc(value, stored):
+    *_, timestamp = helpers.parse_import_row({"description": "x", "amount": "5", "timestamp": value}, MEMBERS, 1)
+    assert timestamp == stored
+
+@pytest.mark.parametrize("row, message", [
+    ({"amount": "5"}, "Description"),
+    ({"description": "x", "amount": "abc"}, "number"),
+    ({"description": "x", "amount": "-5"}, "positive"),
+    ({"description": "x", "amount": "5", "payer": "zed"}, "zed is not a member"),
+    ({"description": "x", "amount": "5", "split": "a:x"}, "weights"),
+    ({"description": "x", "amount": "5", "split": "a:inf"}, "finite"),
+    ({"description": "x", "amount": "5", "split": {"a": 10**400}}, "weights"),
+    ({"description": "x", "amount": "1e30"}, "too large"),
+    ({"description": "\ud800", "amount": "5"}, "valid text"),
+    ({"description": "x", "amount": "5", "timestamp": "yesterday"}, "Timestamp"),
+    ({"description": "x", "amount": "5", "timestamp": "0001-01-01T00:00:00+01:00"}, "Timestamp"),
+    (None, "JSON object"),
+])
+def test_parse_row_errors(row, message):
+    with pytest.raises(ValueError, match=message):
+        helpers.parse_import_row(row, MEMBERS, 1)
+
+def test_import_batches_and_reports_errors(app):
+    lines = ["description,amount,payer"] + [f"row {i},3.00,a" for i in range(7)] + ["bad,,a", "worse,1.00,zed"]
+    rows = helpers.read_import_rows(io.StringIO("\n".join(lines) + "\n"), "csv")
+    with app.app_context():
+        result = helpers.import_expenses(1, MEMBERS, rows, batch_size=3)
+        conn = helpers.get_db()
+        assert result["imported"] == 7 and result["failed"] == 2
+        assert [error["line"] for error in result["errors"]] == [9, 10]
+        assert conn.execute("SELECT COUNT(*) FROM transactions").fetchone()[0] == 7
+        # One version bump per batch, and the ledger matches the history.
+        assert conn.execute("SELECT version FROM groups WHERE id = 1").fetchone()[0] == 3
+        assert helpers.get_balances(conn.cursor(), 1, 1, [{"id": 2}, {"id": 3}]) == {2: 700, 3: 700}
+        assert helpers.rebuild_balances(conn, check_only=True) == 0
+
+def test_jsonl_rows():
+    stream = io.StringIO('{"description": "a", "amount": 1}\n\nnot json\n')
+    assert list(helpers.read_import_rows(stream, "jsonl")) == [(1, {"description": "a", "amount": 1}), (3, None)]
+
+def test_unreadable_csv_keeps_earlier_rows(app):
+    stream = io.StringIO("description,amount\nfine,1.00\nhuge," + "9" * 200_000 + "\nnever,1.00\n")
+    with app.app_context():
+        result = helpers.import_expenses(1, MEMBERS, helpers.read_import_rows(stream, "csv"), 1)
+    assert result["imported"] == 1 and result["failed"] == 1
+    assert result["errors"][0]["line"] == 3 and "CSV could not be parsed" in result["errors"][0]["error"]
+
+def test_route_reports_bad_encoding_instead_of_failing(group_app, login):
+    alice = login(group_app, "alice")
+    upload = io.BytesIO(b"description,amount,split\ntaxi,10.00,\nbad,1.00,alice:inf\n\xff\xfe,1.00,\n")
+    response = alice.post("/groups/1/expenses/import", data={"file": (upload, "expenses.csv")}, content_type="multipart/form-data")
+    assert response.status_code == 200
+    result = response.get_json()
+    assert result["imported"] == 1 and result["failed"] == 2
+    assert [error["line"] for error in result["errors"]] == [3, 4]
+    assert "UTF-8" in result["errors"][1]["error"]
@@ -0,0 +1,33 @@
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import sqlite3
+import pytest
+
+HOT_QUERIES = [
+    ("SELECT net_cents FROM balances WHERE group_id = ? AND creditor_id = ? AND debtor_id = ?", (1, 1, 2)),
+    ("SELECT debtor_id, net_cents FROM balances WHERE group_id = ? AND creditor_id = ?", (1, 1)),
+    ("SELECT * FROM settlements WHERE group_id = ?", (1,)),
+    ("SELECT * FROM memberships WHERE user_id = ? AND group_id = ?", (1, 1)),
+    ("SELECT users.username, users.id FROM memberships JOIN users ON memberships.user_id = users.id WHERE memberships.group_id = ?", (1,)),
+    ("SELECT * FROM transactions WHERE group_id = ?", (1,)),
+    ("SELECT * FROM transactions WHERE group_id = ? AND (timestamp, id) < (?, ?) ORDER BY timestamp DESC, id DESC LIMIT ?", (1, "2025-01-01", 1, 51)),
+    ("SELECT memberships.user_id AS id FROM groups LEFT JOIN memberships ON memberships.group_id = groups.id WHERE groups.id = ?", (1,)),
+    ("SELECT * FROM invites WHERE receiver_id = ? AND group_id = ?", (1, 1)),
+    ("SELECT * FROM groups JOIN memberships ON groups.id = memberships.group_id WHERE memberships.user_id = ?", (1,)),
+    ("SELECT * FROM invites JOIN groups ON invites.group_id = groups.id WHERE invites.receiver_id = ?", (1,)),
+    # Purges and account deletion run under the write lock.
+    ("DELETE FROM invites WHERE rowid IN (SELECT rowid FROM invites WHERE group_id = ? LIMIT ?)", (1, 500)),
+    ("DELETE FROM invites WHERE sender_id = ? OR receiver_id = ?", (1, 1)),
+    ("SELECT groups.id, SUM(balances.net_cents) FROM memberships JOIN groups ON groups.id = memberships.group_id LEFT JOIN balances ON balances.group_id = memberships.group_id AND balances.creditor_id = memberships.user_id WHERE memberships.user_id = ? GROUP BY memberships.group_id", (1,)),
+]
+
+@pytest.mark.parametrize("query, params", HOT_QUERIES)
+def test_hot_query_uses_index(conn, query, params):
+    plan = [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + query, params)]
+    scans = [step for step in plan if step.startswith("SCAN") or "TEMP B-TREE" in step]
+    assert not scans, f"{query!r} falls back to a scan: {plan}"
+
+def test_membership_is_unique(conn):
+    conn.execute("INSERT INTO memberships (user_id, group_id, group_creator) VALUES (1, 1, 1)")
+    with pytest.raises(sqlite3.IntegrityError):
+        conn.execute("INSERT INTO memberships (user_id, group_id, group_creator) VALUES (1, 1, 0)")
@@ -0,0 +1,90 @@
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import sqlite3
+import pytest
+from helpers import apply_transactions_to_balances, get_balances, get_group_summaries, pack_shares, rebuild_balances, record_settlement
+
+SCHEMA = os.path.join(os.path.dirname(__file__), "..", "schema.sql")
+MEMBERS = [{"id": 1}, {"id": 2}, {"id": 3}]
+
+def add_transaction(conn, payer_id, loans):
+    cursor = conn.cursor()
+    cursor.execute("INSERT INTO transactions (group_id, payer_id, amount_cents, shares) VALUES (1, ?, ?, ?)",
+                   (payer_id, sum(share for _, _, share in loans), pack_shares(loans)))
+    transaction_id = cursor.lastrowid
+    apply_transactions_to_balances(cursor, "transactions.id = ?", (transaction_id,))
+    return transaction_id
+
+def test_ledger_tracks_both_sides(conn):
+    add_transaction(conn, 1, [(1, 2, 3000), (1, 3, 3000)])
+    add_transaction(conn, 2, [(2, 1, 1050), (2, 3, 1050)])
+    cursor = conn.cursor()
+    assert get_balances(cursor, 1, 1, MEMBERS) == {1: 0, 2: 1950, 3: 3000}
+    assert get_balances(cursor, 1, 2, MEMBERS) == {1: -1950, 2: 0, 3: 1050}
+    assert get_balances(cursor, 1, 3, MEMBERS) == {1: -3000, 2: -1050, 3: 0}
+
+def test_ledger_subtracts_removed_transactions(conn):
+    transaction_id = add_transaction(conn, 1, [(1, 2, 3000), (1, 3, 3000)])
+    cursor = conn.cursor()
+    apply_transactions_to_balances(cursor, "transactions.id = ?", (transaction_id,), sign=-1)
+    cursor.execute("DELETE FROM transactions WHERE id = ?", (transaction_id,))
+    assert get_balances(cursor, 1, 1, MEMBERS) == {1: 0, 2: 0, 3: 0}
+
+def test_settlement_clears_debt(conn):
+    add_transaction(conn, 1, [(1, 2, 3000), (1, 3, 3000)])
+    cursor = conn.cursor()
+    record_settlement(cursor, 1, 2, 1, 3000)
+    assert get_balances(cursor, 1, 1, MEMBERS) == {1: 0, 2: 0, 3: 3000}
+    assert get_balances(cursor, 1, 2, MEMBERS) == {1: 0, 2: 0, 3: 0}
+
+def test_rebuild_reports_and_repairs_drift(conn):
+    add_transaction(conn, 1, [(1, 2, 3000), (1, 3, 3000)])
+    record_settlement(conn.cursor(), 1, 3, 1, 1000)
+    conn.commit()
+    assert rebuild_balances(conn, check_only=True) == 0
+    conn.execute("UPDATE balances SET net_cents = 1 WHERE debtor_id = 2 AND creditor_id = 1")
+    conn.commit()
+    assert rebuild_balances(conn, check_only=True) == 2
+    assert rebuild_balances(conn) == 2
+    assert rebuild_balances(conn, check_only=True) == 0
+    assert get_balances(conn.cursor(), 1, 1, MEMBERS) == {1: 0, 2: 3000, 3: 2000}
+
+def test_rebuild_keeps_out_concurrent_writes(tmp_path):
+    path = tmp_path / "ledger.db"
+    conn, other = sqlite3.connect(path), sqlite3.connect(path, timeout=0)
+    with open(SCHEMA) as f:
+        conn.executescript(f.read())
+    add_transaction(conn, 1, [(1, 2, 3000)])
+    conn.commit()
+    # Try to commit an expense from another connection just before the
+    # rebuild replaces the ledger; it must wait for the rebuild instead.
+    attempts = []
+    def write_from_other(statement):
+        if statement.startswith("DELETE FROM balances"):
+            try:
+                add_transaction(other, 2, [(2, 1, 500), (2, 3, 500)])
+                other.commit()
+                attempts.append("committed")
+            except sqlite3.OperationalError:
+                other.rollback()
+                attempts.append("locked")
+    conn.set_trace_callback(write_from_other)
+    assert rebuild_balances(conn) == 0
+    conn.set_trace_callback(None)
+    assert attempts == ["locked"]
+    add_transaction(other, 2, [(2, 1, 500), (2, 3, 500)])
+    other.commit()
+    assert rebuild_balances(conn, check_only=True) == 0
+    conn.close()
+    other.close()
+
+def test_group_summaries(conn):
+    conn.executemany("INSERT INTO groups (id, name) VALUES (?, ?)", [(1, "trip"), (2, "flat")])
+    conn.executemany("INSERT INTO memberships (user_id, group_id, group_creator) VALUES (?, ?, ?)",
+                     [(1, 1, 1), (2, 1, 0), (3, 1, 0), (2, 2, 1)])
+    add_transaction(conn, 1, [(1, 2, 3000), (1, 3, 3000)])
+    add_transaction(conn, 2, [(2, 1, 4000)])
+    summaries = {row["id"]: dict(row) for row in get_group_summaries(conn.cursor(), 1)}
+    assert summaries == {1: {"id": 1, "name": "trip", "group_creator": 1, "net_cents": 2000, "debts": 1, "credits": 1}}
+    flat = get_group_summaries(conn.cursor(), 2)
+    assert [(row["id"], row["net_cents"], row["debts"], row["credits"]) for row in flat] == [(1, 1000, 0, 1), (2, 0, 0, 0)]
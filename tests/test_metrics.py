@@ -0,0 +1,62 @@
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import flask
+import pytest
+import helpers
+import metrics
+
+@pytest.fixture
+def app(tmp_path):
+    metrics.reset()
+    app = flask.Flask(__name__)
+    app.config["DATABASE"] = str(tmp_path / "test.db")
+    app.teardown_appcontext(helpers.close_db)
+    app.before_request(metrics.start_request)
+    app.after_request(metrics.finish_request)
+
+    @app.route("/work")
+    def work():
+        conn = helpers.get_db()
+        conn.execute("CREATE TABLE IF NOT EXISTS t (x INTEGER)")
+        conn.cursor().executemany("INSERT INTO t (x) VALUES (?)", [(1,), (2,)])
+        conn.execute("SELECT COUNT(*) FROM t").fetchone()
+        return str(flask.g.db_queries)
+
+    yield app
+    metrics.reset()
+
+def test_queries_counted_per_request(app):
+    # The first request also pays for the new connection's pragmas.
+    client = app.test_client()
+    client.get("/work")
+    assert client.get("/work").text == "3"
+
+def test_latency_and_queries_rendered(app):
+    client = app.test_client()
+    client.get("/work")
+    client.get("/work")
+    text = metrics.render()
+    assert 'fairsplit_request_duration_seconds_count{endpoint="work"} 2' in text
+    assert 'fairsplit_request_duration_seconds_bucket{endpoint="work",le="+Inf"} 2' in text
+    assert 'fairsplit_db_queries_total{endpoint="work"}' in text
+
+def test_slow_query_logged(app, caplog):
+    app.config["SLOW_QUERY_MS"] = 0
+    with caplog.at_level("WARNING", logger="fairsplit.slow_query"):
+        app.test_client().get("/work")
+    assert any("slow query on work" in record.getMessage() and "SELECT COUNT(*) FROM t" in record.getMessage()
+               for record in caplog.records)
+    assert 'fairsplit_db_slow_queries_total{endpoint="work"}' in metrics.render()
+
+def test_slow_query_threshold(app, caplog):
+    app.config["SLOW_QUERY_MS"] = 60_000
+    with caplog.at_level("WARNING", logger="fairsplit.slow_query"):
+        app.test_client().get("/work")
+    assert not caplog.records
+
+def test_server_timing_header(app):
+    client = app.test_client()
+    assert "Server-Timing" not in client.get("/work").headers
+    app.config["SERVER_TIMING"] = True
+    header = client.get("/work").headers["Server-Timing"]
+    assert header.startswith("db;dur=") and 'desc="3 queries"' in header and "app;dur=" in header
@@ -0,0 +1,42 @@
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import pytest
+from helpers import fetch_expenses
+
+@pytest.fixture
+def conn(conn):
+    conn.execute("INSERT INTO users (username, hash) VALUES ('alice', 'x')")
+    # Several expenses share a timestamp so the id tie-breaker is exercised.
+    conn.executemany("INSERT INTO transactions (group_id, payer_id, amount_cents, description, timestamp) VALUES (?, 1, 100, ?, ?)",
+                     [(1, f"expense {i}", f"2025-01-{i // 10 + 1:02d} 12:00:00") for i in range(125)])
+    conn.execute("INSERT INTO transactions (group_id, payer_id, amount_cents, description) VALUES (2, 1, 100, 'other group')")
+    return conn
+
+def test_pages_cover_history_newest_first(conn):
+    seen = []
+    page, cursor = fetch_expenses(conn.cursor(), 1, limit=50)
+    seen += page
+    while cursor:
+        page, cursor = fetch_expenses(conn.cursor(), 1, cursor, limit=50)
+        seen += page
+    assert len(seen) == 125
+    assert [row["description"] for row in seen] == [f"expense {i}" for i in reversed(range(125))]
+    assert seen[0]["added_by"] == "alice"
+
+def test_last_page_has_no_cursor(conn):
+    page, cursor = fetch_expenses(conn.cursor(), 2)
+    assert len(page) == 1 and cursor is None
+
+@pytest.mark.parametrize("cursor", ["garbage", "2020-01-01|", "|5", "2020-01-01|²", "2020-01-01|9223372036854775808",
+                                    "2020-01-01|99999999999999999999", "2020-01-01|" + "9" * 5000])
+def test_invalid_cursor(conn, cursor):
+    with pytest.raises(ValueError, match="Invalid page cursor"):
+        fetch_expenses(conn.cursor(), 1, cursor)
+
+def test_largest_cursor_id_is_accepted(conn):
+    page, _ = fetch_expenses(conn.cursor(), 1, "9999-01-01|9223372036854775807")
+    assert page
+
+def test_route_rejects_oversized_cursor(group_app, login):
+    response = login(group_app, "alice").get("/groups/1/expenses?before=2020-01-01|99999999999999999999")
+    assert response.status_code == 400 and response.get_json() == {"error": "Invalid page cursor."}
@@ -0,0 +1,51 @@
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import threading
+import time
+import flask
+import pytest
+from werkzeug.security import generate_password_hash
+import passwords
+
+@pytest.fixture
+def app():
+    app = flask.Flask(__name__)
+    app.config["PASSWORD_HASH_METHOD"] = "pbkdf2:sha256:1000"
+    with app.app_context():
+        yield app
+
+def test_hash_and_verify(app):
+    pwhash = passwords.hash_password("Secret123")
+    assert pwhash.startswith("pbkdf2:sha256:1000$")
+    assert passwords.verify_password(pwhash, "Secret123")
+    assert not passwords.verify_password(pwhash, "secret123")
+
+def test_needs_rehash(app):
+    assert not passwords.needs_rehash(passwords.hash_password("Secret123"))
+    assert passwords.needs_rehash(generate_password_hash("Secret123", "pbkdf2:sha256:2000"))
+    app.config["PASSWORD_HASH_METHOD"] = "pbkdf2:sha256:2000"
+    assert not passwords.needs_rehash(generate_password_hash("Secret123", "pbkdf2:sha256:2000"))
+
+def test_reject_unknown_user_takes_verify_time(app):
+    passwords.verify_password(passwords.hash_password("Secret123"), "wrong")
+    start = time.perf_counter()
+    passwords.reject_unknown_user()
+    assert time.perf_counter() - start >= passwords._verify_seconds * 0.9
+
+def test_busy_when_no_slot_frees(app, monkeypatch):
+    monkeypatch.setattr(passwords, "_pool", None)
+    app.config.update(PASSWORD_HASH_WORKERS=1, PASSWORD_HASH_QUEUE=0, PASSWORD_HASH_TIMEOUT=0.05)
+    started, release = threading.Event(), threading.Event()
+
+    def hold():
+        with app.app_context():
+            passwords._run(lambda: started.set() or release.wait(5))
+
+    holder = threading.Thread(target=hold)
+    holder.start()
+    started.wait(5)
+    with pytest.raises(passwords.HashingBusy):
+        passwords.hash_password("Secret123")
+    release.set()
+    holder.join()
+    monkeypatch.setattr(passwords, "_pool", None)
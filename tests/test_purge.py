@@ -0,0 +1,78 @@
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import json
+import pytest
+from helpers import (apply_transactions_to_balances, get_balances, get_group_summaries, pack_shares, purge_status,
+                     purge_step, rebuild_balances, record_settlement, tombstone_group, tombstone_user)
+
+@pytest.fixture
+def conn(conn):
+    conn.executemany("INSERT INTO users (id, username, hash) VALUES (?, ?, 'x')", [(1, "a"), (2, "b"), (3, "c")])
+    conn.executemany("INSERT INTO groups (id, name) VALUES (?, ?)", [(1, "trip"), (2, "flat")])
+    conn.executemany("INSERT INTO memberships (user_id, group_id, group_creator) VALUES (?, ?, ?)",
+                     [(1, 1, 1), (2, 1, 0), (3, 1, 0), (1, 2, 1), (2, 2, 0)])
+    for group_id, payer_id, loans in [(1, 1, [(1, 2, 1000), (1, 3, 1000)]), (1, 2, [(2, 1, 500), (2, 3, 500)]),
+                                      (1, 3, [(3, 1, 300), (3, 2, 300)]), (2, 1, [(1, 2, 700)])] * 3:
+        cursor = conn.execute("INSERT INTO transactions (group_id, payer_id, amount_cents, shares) VALUES (?, ?, ?, ?)",
+                              (group_id, payer_id, sum(cents for _, _, cents in loans), pack_shares(loans)))
+        apply_transactions_to_balances(conn.cursor(), "transactions.id = ?", (cursor.lastrowid,))
+    record_settlement(conn.cursor(), 1, 3, 1, 100)
+    conn.commit()
+    return conn
+
+def count(conn, table, condition="true", params=()):
+    return conn.execute(f"SELECT COUNT(*) FROM {table} WHERE {condition}", params).fetchone()[0]
+
+def test_group_purged_in_batches(conn):
+    tombstone_group(conn.cursor(), 1)
+    conn.commit()
+    assert [row["id"] for row in get_group_summaries(conn.cursor(), 1)] == [2]
+    steps = 0
+    while purge_step(conn, batch_size=2):
+        steps += 1
+    assert steps > 5
+    for table in ("transactions", "settlements", "balances", "memberships"):
+        assert count(conn, table, "group_id = 1") == 0
+    assert count(conn, "groups", "id = 1") == 0
+    assert count(conn, "transactions", "group_id = 2") == 3
+    [purge] = purge_status(conn.cursor())
+    assert purge["finished_at"] is not None and purge["rows_deleted"] > 0
+
+def test_user_purge_keeps_other_balances(conn):
+    tombstone_user(conn.cursor(), 3)
+    conn.commit()
+    members = [{"id": 1}, {"id": 2}]
+    before = get_balances(conn.cursor(), 1, 1, members)
+    assert count(conn, "memberships", "user_id = 3") == 0
+    assert count(conn, "balances", "debtor_id = 3 OR creditor_id = 3") == 0
+    # Mid-purge, the ledger still matches what is left of the history.
+    purge_step(conn, batch_size=2)
+    assert rebuild_balances(conn, check_only=True) == 0
+    while purge_step(conn, batch_size=2):
+        pass
+    assert count(conn, "users", "id = 3") == 0
+    assert count(conn, "transactions", "payer_id = 3") == 0
+    assert count(conn, "transactions", "json_type(shares, '$.\"3\"') IS NOT NULL") == 0
+    assert count(conn, "settlements", "debtor_id = 3 OR creditor_id = 3") == 0
+    assert get_balances(conn.cursor(), 1, 1, members) == before
+    assert rebuild_balances(conn, check_only=True) == 0
+
+def test_user_purge_only_walks_their_groups(conn):
+    # User 3 is only in group 1; a busy group 2 must not add work.
+    conn.executemany("INSERT INTO transactions (group_id, payer_id, amount_cents, shares) VALUES (2, 1, 700, ?)",
+                     [(pack_shares([(1, 2, 700)]),)] * 100)
+    tombstone_user(conn.cursor(), 3)
+    conn.commit()
+    [purge] = purge_status(conn.cursor())
+    assert json.loads(purge["group_ids"]) == [1] and purge["groups_left"] == 1
+    steps = 0
+    while purge_step(conn, batch_size=2):
+        steps += 1
+    # Five batches of group 1's nine transactions, one of settlements, one
+    # to finish the group and one to delete the user.
+    assert steps == 8
+    assert count(conn, "users", "id = 3") == 0
+    assert count(conn, "transactions", "group_id = 2") == 103
+
+def test_purge_step_idle(conn):
+    assert not purge_step(conn)
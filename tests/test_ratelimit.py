@@ -0,0 +1,50 @@
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import time
+import pytest
+from limits import parse
+from limits.storage import storage_from_string
+from limits.strategies import FixedWindowRateLimiter
+import ratelimit
+
+@pytest.fixture
+def uri(tmp_path):
+    return f"sqlite:///{tmp_path / 'ratelimit.db'}"
+
+def test_scheme_registered(uri):
+    assert isinstance(storage_from_string(uri), ratelimit.SQLiteStorage)
+
+def test_incr_get_and_clear(uri):
+    storage = storage_from_string(uri)
+    assert storage.incr("k", 60) == 1
+    assert storage.incr("k", 60, amount=2) == 3
+    assert storage.get("k") == 3
+    assert time.time() < storage.get_expiry("k") <= time.time() + 60
+    storage.clear("k")
+    assert storage.get("k") == 0
+
+def test_window_restarts_after_expiry(uri):
+    storage = storage_from_string(uri)
+    storage.incr("k", 0.05)
+    storage.incr("k", 0.05)
+    time.sleep(0.1)
+    assert storage.get("k") == 0
+    assert storage.incr("k", 60) == 1
+
+def test_counters_shared_between_instances(uri):
+    # Two workers each build their own storage object for the same file.
+    limiter_a = FixedWindowRateLimiter(storage_from_string(uri))
+    limiter_b = FixedWindowRateLimiter(storage_from_string(uri))
+    limit = parse("3 per minute")
+    assert limiter_a.hit(limit, "ip")
+    assert limiter_b.hit(limit, "ip")
+    assert limiter_a.hit(limit, "ip")
+    assert not limiter_b.hit(limit, "ip")
+
+def test_reset_and_check(uri):
+    storage = storage_from_string(uri)
+    storage.incr("a", 60)
+    storage.incr("b", 60)
+    assert storage.check()
+    assert storage.reset() == 2
+    assert storage.get("a") == 0
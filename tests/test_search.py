@@ -0,0 +1,79 @@
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import datetime
+import pytest
+from helpers import fts_query, search_expenses
+
+@pytest.fixture
+def conn(conn):
+    conn.executemany("INSERT INTO users (id, username, hash) VALUES (?, ?, 'x')", [(1, "a"), (2, "b")])
+    conn.executemany("INSERT INTO transactions (group_id, payer_id, amount_cents, description, timestamp) VALUES (?, ?, ?, ?, ?)", [
+        (1, 1, 4500, "Dinner at Luigi's", "2024-03-01 20:00:00"),
+        (1, 2, 1200, "Taxi from dinner", "2024-03-02 01:00:00"),
+        (1, 1, 30000, "Hotel", "2024-03-02 12:00:00"),
+        (1, 2, 800, "Café breakfast", "2024-03-03 09:00:00"),
+        (2, 1, 5000, "Dinner dinner dinner", "2024-03-01 20:00:00"),
+    ])
+    conn.commit()
+    return conn
+
+def ids(conn, text, **filters):
+    rows, _ = search_expenses(conn.cursor(), 1, text, **filters)
+    return [row["id"] for row in rows]
+
+def test_search_stays_in_group(conn):
+    assert sorted(ids(conn, "dinner")) == [1, 2]
+
+def test_last_word_is_a_prefix_and_accents_fold(conn):
+    assert ids(conn, "hot") == [3]
+    assert ids(conn, "cafe") == [4]
+    assert ids(conn, "taxi din") == [2]
+
+def test_filters(conn):
+    assert ids(conn, "dinner", min_cents=2000) == [1]
+    assert ids(conn, "dinner", max_cents=2000) == [2]
+    assert ids(conn, "dinner", since=datetime.date(2024, 3, 2)) == [2]
+    assert ids(conn, "dinner", until=datetime.date(2024, 3, 1)) == [1]
+
+def test_pages(conn):
+    first, more = search_expenses(conn.cursor(), 1, "dinner", limit=1)
+    second, last = search_expenses(conn.cursor(), 1, "dinner", page=2, limit=1)
+    assert more and not last
+    assert {first[0]["id"], second[0]["id"]} == {1, 2}
+
+@pytest.mark.parametrize("page, message", [(0, "positive"), (2**63, "too large"), (10**20, "too large")])
+def test_page_out_of_range(conn, page, message):
+    with pytest.raises(ValueError, match=message):
+        search_expenses(conn.cursor(), 1, "dinner", page=page)
+
+def test_until_the_last_date(conn):
+    assert ids(conn, "hotel", until=datetime.date.max) == [3]
+
+def test_route_rejects_huge_page(group_app, login):
+    alice = login(group_app, "alice")
+    alice.post("/groups/1/expenses/add", data={"description": "Taxi", "amount": "20"})
+    response = alice.get("/groups/1/search?q=taxi&page=99999999999999999999")
+    assert response.status_code == 400 and response.get_json() == {"error": "Page is too large."}
+    [expense] = alice.get("/groups/1/search?q=taxi").get_json()["expenses"]
+    assert expense["description"] == "Taxi" and expense["added_by"] == "alice" and expense["can_remove"]
+    assert login(group_app, "bob").get("/groups/1/expenses").get_json()["expenses"][0]["can_remove"] is False
+
+def test_index_follows_writes(conn):
+    conn.execute("INSERT INTO transactions (group_id, payer_id, amount_cents, description) VALUES (1, 1, 100, 'Museum tickets')")
+    assert ids(conn, "museum") == [6]
+    conn.execute("UPDATE transactions SET description = 'Gallery tickets' WHERE id = 6")
+    assert ids(conn, "museum") == [] and ids(conn, "gallery") == [6]
+    conn.execute("DELETE FROM transactions WHERE id = 6")
+    assert ids(conn, "tickets") == []
+
+@pytest.mark.parametrize("text", ['"unbalanced', "group_id : 2", "NEAR(a b)", "din*", "a OR b AND"])
+def test_user_input_is_not_fts_syntax(conn, text):
+    search_expenses(conn.cursor(), 1, text)
+
+def test_empty_search_rejected():
+    with pytest.raises(ValueError):
+        fts_query("  ?! ", 1)
+
+def test_search_does_not_scan_transactions(conn):
+    plan = [row[3] for row in conn.execute("EXPLAIN QUERY PLAN SELECT transactions.id FROM transactions_fts JOIN transactions ON transactions.id = transactions_fts.rowid WHERE transactions_fts MATCH ?", (fts_query("dinner", 1),))]
+    assert not [step for step in plan if step.startswith("SCAN transactions ") or step == "SCAN transactions"], plan
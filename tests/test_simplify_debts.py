@@ -0,0 +1,44 @@
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import random
+import pytest
+from helpers import simplify_debts
+
+def settle(net_positions, transfers):
+    remaining = dict(net_positions)
+    for debtor_id, creditor_id, cents in transfers:
+        assert cents > 0
+        remaining[debtor_id] += cents
+        remaining[creditor_id] -= cents
+    return remaining
+
+def test_chain_collapses_to_one_transfer():
+    # 1 owes 2 and 2 owes 3 the same amount: 1 should pay 3 directly.
+    assert simplify_debts({1: -1000, 2: 0, 3: 1000}) == [(1, 3, 1000)]
+
+def test_largest_debtor_pays_largest_creditor():
+    transfers = simplify_debts({1: -3000, 2: -1000, 3: 2500, 4: 1500})
+    assert transfers[0] == (1, 3, 2500)
+    assert all(v == 0 for v in settle({1: -3000, 2: -1000, 3: 2500, 4: 1500}, transfers).values())
+
+def test_everyone_settled():
+    assert simplify_debts({1: 0, 2: 0}) == []
+    assert simplify_debts({}) == []
+
+def test_positions_must_sum_to_zero():
+    with pytest.raises(ValueError, match="sum to zero"):
+        simplify_debts({1: -100, 2: 50})
+
+def test_positions_must_be_cents():
+    with pytest.raises(ValueError, match="integer cents"):
+        simplify_debts({1: -1.5, 2: 1.5})
+
+def test_random_groups_settle_with_at_most_n_minus_one_transfers():
+    rng = random.Random(7)
+    for _ in range(50):
+        n = rng.randint(2, 200)
+        positions = {i: rng.randint(-50_000, 50_000) for i in range(1, n)}
+        positions[n] = -sum(positions.values())
+        transfers = simplify_debts(positions)
+        assert len(transfers) <= n - 1
+        assert all(v == 0 for v in settle(positions, transfers).values())